@@ -1,33 +1,66 @@
 import os
+import asyncio
 import datetime
 from contextlib import asynccontextmanager
+from typing import Optional
 from uuid import uuid4
 
-import bcrypt
 import jwt
+import anyio.to_thread
+import asyncpg
 import psycopg2
-import smtplib
-from email.message import EmailMessage
 import cloudinary
-import cloudinary.uploader
 
-from fastapi import FastAPI, File, UploadFile, Depends, HTTPException, Query, Request
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from apscheduler.schedulers.background import BackgroundScheduler
 
 from models import (
     SignupRequest, LoginRequest, UserProfile,
     CreateComment, ForgotPasswordRequest, ResetPasswordRequest,
-    ContactRequest, PollVoteRequest,
+    ContactRequest, PollVoteRequest, ProfilingSettings,
 )
-from db import SECRET_KEY, get_db
-from util import get_current_user, require_superuser
-from feed import build_feed_page, refresh_comments_cache, FEED_MAX_PAGES
-from get_youtube import fetch_all_youtube, youtube_cache
-from get_bluesky import fetch_all_bluesky
-from get_pinecast import get_podcast
-
-TITAN_PW = os.getenv("TITAN_PW")
+from db import (
+    SECRET_KEY, get_db, get_async_db, close_pool, close_async_pool,
+    pool_stats, async_pool_stats, PoolTimeout,
+)
+from util import (
+    get_current_user, require_superuser, invalidate_user, publish_user_change, auth_cache_stats, user_id_from_token,
+    is_superuser_token,
+)
+from config import INGEST_MODE, METRICS_TOKEN
+from feed import (
+    FEED_MAX_PAGES, comments_cache, stop_comments_pusher, feed_events, publish_feed_updates, render_feed_event,
+)
+from get_youtube import youtube_cache, youtube_quota
+from get_bluesky import bluesky_cache
+from get_pinecast import podcast_cache
+from ingest import warm_start, run_and_schedule, follow_snapshots, follow_comments
+from pages import render_pages, serve_page
+from compression import CompressionMiddleware
+from engine import source_stats, executor_stats
+from comments import (
+    fetch_thread_page, invalidate_thread, publish_thread_change, thread_cache,
+    COMMENTS_PAGE_SIZE, COMMENTS_MAX_PAGE_SIZE,
+)
+from notify import start_listener, stop_listener, listener_stats, USERS_CHANNEL
+from poll import (
+    get_active_poll, get_user_vote, cast_vote, poll_response, run_flusher, get_poll_stats,
+    poll_broadcaster, broadcast_poll, render_poll_event, watch_poll,
+)
+from broadcast import SSE_HEADERS
+from uploads import read_upload, submit_upload, job_status, upload_jobs, shutdown_uploads, get_upload_stats
+from storage import avatar_url, get_storage, LocalStorage, MEDIA_NAME
+from ratelimit import RateLimitMiddleware, get_rate_limit_stats
+from metrics import MetricsMiddleware, collector, render_metrics
+from profiling import ProfilingMiddleware, ProfiledRoute, configure, get_profiling_state, list_profiles, get_profile
+from mailer import enqueue_email, start_mail_sender, stop_mail_sender, get_mail_stats
+from passwords import (
+    hash_password, verify_password, needs_rehash, shutdown_pool, PasswordPoolBusy,
+    password_stats, get_password_stats,
+)
+
 FRONTEND_URL = os.getenv("FRONTEND_URL", "https://funk-27.co.uk")
 
 cloudinary.config(
@@ -37,21 +70,73 @@ cloudinary.config(
 )
 
 
+def on_cache_refresh():
+    """Runs after any feed cache changes: re-render pages, push new items to streams."""
+    render_pages()
+    publish_feed_updates()
+
+
+def on_comments_refresh():
+    """Comments only appear on /feed, so only its pages are re-rendered."""
+    render_pages(("feed",))
+    publish_feed_updates()
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    fetch_all_youtube()
-    fetch_all_bluesky()
-    refresh_comments_cache()
+    feed_events.bind()
+    poll_broadcaster.bind()
+    warm_start(on_refresh=on_cache_refresh)
     scheduler = BackgroundScheduler()
-    scheduler.add_job(fetch_all_youtube, "interval", hours=1)
-    scheduler.add_job(fetch_all_bluesky, "interval", hours=1)
-    scheduler.add_job(refresh_comments_cache, "interval", minutes=5)
+    if INGEST_MODE == "external":
+        follow_snapshots(scheduler, on_refresh=on_cache_refresh)
+    else:
+        run_and_schedule(scheduler, on_refresh=on_cache_refresh)
+    follow_comments(scheduler, on_refresh=on_comments_refresh)
     scheduler.start()
+    start_mail_sender()
+    start_listener()
+    tasks = [asyncio.create_task(run_flusher()), asyncio.create_task(watch_poll())]
     yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    stop_listener()
+    stop_mail_sender()
+    shutdown_uploads()
+    stop_comments_pusher()
     scheduler.shutdown()
+    close_pool()
+    await close_async_pool()
+    shutdown_pool()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+# Registers sync handlers' threadpool threads with the request's profile
+app.router.route_class = ProfiledRoute
+
+
+@app.exception_handler(PoolTimeout)
+def pool_timeout_handler(request: Request, exc: PoolTimeout):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Database busy, please retry."},
+        headers={"Retry-After": "1"},
+    )
 
 
-app = FastAPI(lifespan=lifespan)
+@app.exception_handler(PasswordPoolBusy)
+def password_pool_busy_handler(request: Request, exc: PasswordPoolBusy):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Too many sign-in requests, please retry."},
+        headers={"Retry-After": "2"},
+    )
+
+# Innermost, so a profile covers the handler rather than the other middleware
+app.add_middleware(ProfilingMiddleware, authorize=is_superuser_token)
+# Added before CORS so 429/503 responses still carry CORS headers
+app.add_middleware(RateLimitMiddleware)
 
 origins = [
     "http://localhost:3000",
@@ -65,28 +150,32 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.get("/feed")
-def get_feed(page: int = Query(1, ge=1, le=FEED_MAX_PAGES)):
-    return build_feed_page(page)
+def get_feed(request: Request, page: int = Query(1, ge=1, le=FEED_MAX_PAGES)):
+    return serve_page(request, "feed", page)
 
 
-PAGE_SIZE = 50
-MAX_PAGES = 4
+@app.get("/feed/stream")
+async def stream_feed(request: Request, since: Optional[str] = None):
+    """
+    Server-Sent Events: new feed items as each source refreshes or a comment
+    is posted. Resume with ?since=<token> or the Last-Event-ID header.
+    """
+    resume_token = since or request.headers.get("last-event-id")
+    return StreamingResponse(
+        feed_events.stream(render_feed_event, resume_token),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
 
 
 @app.get("/youtube")
-def get_youtube(page: int = Query(1, ge=1, le=MAX_PAGES)):
-    items = youtube_cache["items"]
-    start = (page - 1) * PAGE_SIZE
-    end = start + PAGE_SIZE
-    total_pages = min(MAX_PAGES, -(-len(items) // PAGE_SIZE))  # ceil division, capped at 4
-    return {
-        "items": items[start:end],
-        "page": page,
-        "total_pages": total_pages,
-    }
+def get_youtube(request: Request, page: int = Query(1, ge=1)):
+    return serve_page(request, "youtube", page)
 
 
 @app.get("/")
@@ -97,156 +186,163 @@ def read_root():
 # ---------- AUTH'D PROFILE ----------
 
 @app.get("/me")
-def get_my_profile(current_user: dict = Depends(get_current_user)):
-    with get_db() as (conn, cur):
-        cur.execute(
+async def get_my_profile(current_user: dict = Depends(get_current_user)):
+    async with get_async_db() as conn:
+        row = await conn.fetchrow(
             """
             SELECT up.*
             FROM users u
             JOIN user_profiles up ON u.id = up.user_id
-            WHERE u.id = %s
+            WHERE u.id = $1
             """,
-            (current_user["id"],),
+            current_user["id"],
         )
-        row = cur.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="Profile not found.")
 
-        columns = [desc[0] for desc in cur.description]
-        return dict(zip(columns, row))
+        return dict(row)
 
 
 # ---------- UPLOAD PROFILE PICTURE (AUTH ONLY) ----------
 
-@app.post("/upload-profile-picture")
+@app.post("/upload-profile-picture", status_code=202)
 async def upload_profile_picture(
-    file: UploadFile = File(...),
+    request: Request,
     current_user: dict = Depends(get_current_user),
 ):
-    file_ext = os.path.splitext(file.filename)[1].lower()
-    if file_ext not in [".jpg", ".jpeg", ".png"]:
-        raise HTTPException(status_code=400, detail="Only .jpg, .jpeg, .png allowed.")
+    data = await read_upload(request)
+    job = submit_upload(current_user["id"], data)
+    return {
+        "message": "Profile picture upload started",
+        **job_status(job),
+    }
 
-    try:
-        result = cloudinary.uploader.upload(
-            file.file,
-            public_id=str(current_user["id"]),
-            folder="profile_pics",
-            format="jpg",
-            overwrite=True,
-            transformation=[{"width": 400, "height": 400, "crop": "fill", "gravity": "face"}],
-        )
-        url = result["secure_url"]
-    except Exception:
-        raise HTTPException(status_code=500, detail="Image upload failed.")
 
-    with get_db() as (conn, cur):
-        cur.execute(
-            "UPDATE user_profiles SET profile_picture = %s WHERE user_id = %s",
-            (url, current_user["id"]),
-        )
-        conn.commit()
-        return {
-            "message": "Profile picture updated",
-            "url": url,
-        }
+@app.get("/media/{name}")
+def get_media(name: str):
+    storage = get_storage()
+    path = os.path.join(storage.root, name) if isinstance(storage, LocalStorage) else None
+    if not MEDIA_NAME.match(name) or path is None or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Not found.")
+    # Names are content hashes, so a URL's bytes never change
+    return FileResponse(
+        path,
+        media_type="image/jpeg",
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+
+@app.get("/upload-profile-picture/{job_id}")
+def get_upload_status(job_id: str, current_user: dict = Depends(get_current_user)):
+    job = upload_jobs.get(job_id)
+    if job is None or job["user_id"] != str(current_user["id"]):
+        raise HTTPException(status_code=404, detail="Upload not found.")
+    return job_status(job)
 
 
 # ---------- SIGNUP / LOGIN ----------
 
 @app.post("/signup")
-def signup(req: SignupRequest):
-    hashed = bcrypt.hashpw(req.password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+async def signup(req: SignupRequest):
+    hashed = await hash_password(req.password)
 
-    with get_db() as (conn, cur):
+    async with get_async_db() as conn:
         try:
-            cur.execute(
-                """
-                INSERT INTO users (email, password_hash)
-                VALUES (%s, %s)
-                RETURNING id
-                """,
-                (req.email, hashed),
-            )
-            user_id = cur.fetchone()[0]
-
-            cur.execute(
-                """
-                INSERT INTO user_profiles (user_id, email)
-                VALUES (%s, %s)
-                RETURNING user_id, email
-                """,
-                (user_id, req.email),
-            )
-            user_profile = cur.fetchone()
-            conn.commit()
+            async with conn.transaction():
+                user_id = await conn.fetchval(
+                    """
+                    INSERT INTO users (email, password_hash)
+                    VALUES ($1, $2)
+                    RETURNING id
+                    """,
+                    req.email, hashed,
+                )
 
-            payload = {
-                "sub": str(user_id),
-                "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
-            }
-            token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
-
-            return {
-                "message": "User and profile created successfully.",
-                "user_id": str(user_id),
-                "access_token": token,
-                "token_type": "bearer",
-                "profile": {
-                    "user_id": str(user_profile[0]),
-                    "first_name": "",
-                    "last_name": "",
-                    "email": req.email,
-                    "profile_picture": "",
-                },
-            }
-        except psycopg2.IntegrityError as e:
-            conn.rollback()
+                user_profile = await conn.fetchrow(
+                    """
+                    INSERT INTO user_profiles (user_id, email)
+                    VALUES ($1, $2)
+                    RETURNING user_id, email
+                    """,
+                    user_id, req.email,
+                )
+        except asyncpg.IntegrityConstraintViolationError as e:
             raise HTTPException(status_code=400, detail=f"Signup failed: {e}")
 
+    payload = {
+        "sub": str(user_id),
+        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+    }
+    token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+    return {
+        "message": "User and profile created successfully.",
+        "user_id": str(user_id),
+        "access_token": token,
+        "token_type": "bearer",
+        "profile": {
+            "user_id": str(user_profile[0]),
+            "first_name": "",
+            "last_name": "",
+            "email": req.email,
+            "profile_picture": "",
+        },
+    }
+
 
 @app.post("/login")
-def login(req: LoginRequest):
-    with get_db() as (conn, cur):
-        cur.execute(
-            "SELECT id, password_hash FROM users WHERE email = %s",
-            (req.email,),
+async def login(req: LoginRequest):
+    async with get_async_db() as conn:
+        result = await conn.fetchrow(
+            "SELECT id, password_hash FROM users WHERE email = $1",
+            req.email,
         )
-        result = cur.fetchone()
-        if not result:
-            raise HTTPException(status_code=400, detail="Invalid email or password.")
+    if not result:
+        raise HTTPException(status_code=400, detail="Invalid email or password.")
 
-        user_id, stored_hash = result[0], result[1]
-        if not bcrypt.checkpw(req.password.encode("utf-8"), stored_hash.encode("utf-8")):
-            raise HTTPException(status_code=400, detail="Invalid email or password.")
+    user_id, stored_hash = result[0], result[1]
+    if not await verify_password(req.password, stored_hash):
+        raise HTTPException(status_code=400, detail="Invalid email or password.")
 
-        payload = {
-            "sub": str(user_id),
-            "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
-        }
-        token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
-        return {"access_token": token, "token_type": "bearer"}
+    if needs_rehash(stored_hash):
+        # BCRYPT_ROUNDS changed since this hash was made; upgrade it while we have the password
+        try:
+            new_hash = await hash_password(req.password)
+            async with get_async_db() as conn:
+                await conn.execute(
+                    "UPDATE users SET password_hash = $1 WHERE id = $2 AND password_hash = $3",
+                    new_hash, user_id, stored_hash,
+                )
+            password_stats["rehashed"] += 1
+        except PasswordPoolBusy:
+            pass  # try again on a later login
+
+    payload = {
+        "sub": str(user_id),
+        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+    }
+    token = jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+    return {"access_token": token, "token_type": "bearer"}
 
 
 # ---------- PROFILE ----------
 
 @app.get("/user/{user_id}")
-def get_user(user_id: str):
-    with get_db() as (conn, cur):
-        cur.execute(
+async def get_user(user_id: str):
+    async with get_async_db() as conn:
+        row = await conn.fetchrow(
             """
             SELECT user_id, first_name, last_name, email, profile_picture, created_at, verified
             FROM user_profiles
-            WHERE user_id = %s
+            WHERE user_id = $1
             """,
-            (user_id,),
+            user_id,
         )
-        row = cur.fetchone()
         if not row:
             raise HTTPException(status_code=404, detail="User not found")
 
         return {
-            "user_id": row[0],
+            "user_id": str(row[0]),
             "first_name": row[1],
             "profile_picture": row[4],
             "created_at": row[5],
@@ -286,7 +382,9 @@ def update_user_profile(
                     current_user["id"],
                 ),
             )
+            publish_user_change(cur, current_user["id"])
             conn.commit()
+            invalidate_user(current_user["id"])
             return {"message": "User profile updated successfully"}
         except psycopg2.Error as e:
             conn.rollback()
@@ -296,17 +394,8 @@ def update_user_profile(
 # ---------- PASSWORD RESET (EMAIL-BASED TOKEN) ----------
 
 def send_reset_email(to_email, reset_token):
-    sender_email = "aid@funk-27.co.uk"
     reset_url = f"{FRONTEND_URL}/reset-password?token={reset_token}"
-    msg = EmailMessage()
-    msg["Subject"] = "Reset Your Password"
-    msg["From"] = sender_email
-    msg["To"] = to_email
-    msg.set_content(f"Click here to reset your password: {reset_url}")
-
-    with smtplib.SMTP_SSL("smtp.titan.email", 465) as server:
-        server.login(sender_email, TITAN_PW)
-        server.send_message(msg)
+    enqueue_email(to_email, "Reset Your Password", f"Click here to reset your password: {reset_url}")
 
 
 @app.post("/forgot-password")
@@ -331,7 +420,7 @@ def forgot_password(req: ForgotPasswordRequest):
 
 
 @app.post("/reset-password")
-def reset_password(req: ResetPasswordRequest):
+async def reset_password(req: ResetPasswordRequest):
     try:
         decoded = jwt.decode(req.reset_token, SECRET_KEY, algorithms=["HS256"])
         email = decoded.get("sub")
@@ -340,39 +429,49 @@ def reset_password(req: ResetPasswordRequest):
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=400, detail="Invalid token")
 
-    hashed = bcrypt.hashpw(req.new_password.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    hashed = await hash_password(req.new_password)
 
-    with get_db() as (conn, cur):
-        cur.execute("UPDATE users SET password_hash = %s WHERE email = %s", (hashed, email))
-        conn.commit()
-        return {"message": "Password reset successfully"}
+    async with get_async_db() as conn:
+        # Notify in the same statement so other workers drop the cached user on commit
+        updated = await conn.fetch(
+            """
+            WITH updated AS (
+                UPDATE users SET password_hash = $1 WHERE email = $2 RETURNING id
+            )
+            SELECT id, pg_notify($3, id::text) FROM updated
+            """,
+            hashed, email, USERS_CHANNEL,
+        )
+    for row in updated:
+        invalidate_user(row[0])
+    return {"message": "Password reset successfully"}
 
 
 # ---------- COMMENTS ----------
 
-def _fetch_user_comments(user_id: str):
-    with get_db() as (conn, cur):
-        cur.execute(
+async def _fetch_user_comments(user_id: str):
+    async with get_async_db() as conn:
+        rows = await conn.fetch(
             """
             SELECT id, content, created_at, author_name, author_profile_picture, user_id, target_id
             FROM comments
-            WHERE user_id = %s
+            WHERE user_id = $1
             ORDER BY created_at DESC
             LIMIT 10
             """,
-            (user_id,),
+            str(user_id),
         )
         return [
             {
-                "id": row[0],
+                "id": str(row[0]),
                 "content": row[1],
                 "created_at": row[2].isoformat(),
                 "author_name": row[3],
-                "author_profile_picture": row[4],
-                "user_id": row[5],
+                "author_profile_picture": avatar_url(row[4]),
+                "user_id": str(row[5]),
                 "target_id": row[6],
             }
-            for row in cur.fetchall()
+            for row in rows
         ]
 
 
@@ -426,7 +525,9 @@ def create_comment(
                     profile_picture,
                 ),
             )
+            publish_thread_change(cur, target_id)
             conn.commit()
+            invalidate_thread(target_id)
             return {"message": "Comment posted", "target_id": target_id}
         except psycopg2.Error as e:
             conn.rollback()
@@ -434,146 +535,82 @@ def create_comment(
 
 
 @app.get("/comments/me")
-def list_my_comments(current_user: dict = Depends(get_current_user)):
-    return {"comments": _fetch_user_comments(current_user["id"])}
+async def list_my_comments(current_user: dict = Depends(get_current_user)):
+    return {"comments": await _fetch_user_comments(current_user["id"])}
 
 
 @app.get("/comments/{target_type}/{target_id:path}")
-def list_comments(target_type: str, target_id: str):
-    with get_db() as (conn, cur):
-        full_target_id = f"/{target_type}/{target_id}"
-        cur.execute(
-            """
-            SELECT user_id, content, created_at, author_name, author_profile_picture
-            FROM comments
-            WHERE target_id = %s
-            ORDER BY created_at DESC
-            """,
-            (full_target_id,),
-        )
-        comments = [
-            {
-                "user_id": row[0],
-                "content": row[1],
-                "created_at": row[2].isoformat(),
-                "author_name": row[3],
-                "author_profile_picture": row[4],
-            }
-            for row in cur.fetchall()
-        ]
-        return {"comments": comments}
+async def list_comments(
+    target_type: str,
+    target_id: str,
+    limit: int = Query(COMMENTS_PAGE_SIZE, ge=1, le=COMMENTS_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+):
+    full_target_id = f"/{target_type}/{target_id}"
+    return await fetch_thread_page(full_target_id, limit, cursor)
 
 
 @app.get("/recent_activity/{user_id}")
-def list_user_comments(user_id: str):
-    return {"comments": _fetch_user_comments(user_id)}
+async def list_user_comments(user_id: str):
+    return {"comments": await _fetch_user_comments(user_id)}
 
 
 @app.post("/contact")
 def contact(req: ContactRequest):
-    msg = EmailMessage()
-    msg["Subject"] = f"Funk-27 contact from {req.email}"
-    msg["From"] = "aid@funk-27.co.uk"
-    msg["To"] = "aid@funk-27.co.uk"
-    msg["Reply-To"] = req.email
-    msg.set_content(f"From: {req.email}\n\n{req.message}")
-
-    try:
-        with smtplib.SMTP_SSL("smtp.titan.email", 465) as server:
-            server.login("aid@funk-27.co.uk", TITAN_PW)
-            server.send_message(msg)
-    except Exception:
-        raise HTTPException(status_code=500, detail="Failed to send message.")
+    enqueue_email(
+        "aid@funk-27.co.uk",
+        f"Funk-27 contact from {req.email}",
+        f"From: {req.email}\n\n{req.message}",
+        reply_to=req.email,
+    )
 
     return {"message": "Message sent."}
 
 
 @app.get("/podcast")
-def list_podcast_eps():
-    return get_podcast()
+def list_podcast_eps(request: Request, page: int = Query(1, ge=1)):
+    return serve_page(request, "podcast", page)
 
 
 # ---------- POLL ----------
 
-def _poll_response(poll_id, question, yes_votes, no_votes, user_vote):
-    total = yes_votes + no_votes
-    return {
-        "poll_id": str(poll_id),
-        "question": question,
-        "yes_votes": yes_votes,
-        "no_votes": no_votes,
-        "total": total,
-        "yes_percent": round(yes_votes / total * 100) if total > 0 else 0,
-        "no_percent": round(no_votes / total * 100) if total > 0 else 0,
-        "user_vote": user_vote,
-    }
-
-
 @app.get("/poll")
-def get_poll(request: Request):
+async def get_poll(request: Request):
     user_id = None
     auth_header = request.headers.get("Authorization", "")
     if auth_header.startswith("Bearer "):
-        token = auth_header[7:]
-        try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-            user_id = payload.get("sub")
-        except (jwt.ExpiredSignatureError, jwt.InvalidTokenError):
-            pass
+        user_id = user_id_from_token(auth_header[7:])
 
-    with get_db() as (conn, cur):
-        cur.execute(
-            "SELECT id, question, yes_votes, no_votes FROM polls ORDER BY created_at DESC LIMIT 1"
-        )
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="No poll found.")
+    poll = await get_active_poll()
+    if poll is None:
+        raise HTTPException(status_code=404, detail="No poll found.")
 
-        poll_id, question, yes_votes, no_votes = row
+    user_vote = await get_user_vote(poll["id"], user_id) if user_id else None
+    return poll_response(poll["id"], poll["question"], poll["yes"], poll["no"], user_vote)
 
-        user_vote = None
-        if user_id:
-            cur.execute(
-                "SELECT vote FROM poll_votes WHERE poll_id = %s AND user_id = %s",
-                (poll_id, user_id),
-            )
-            vote_row = cur.fetchone()
-            if vote_row:
-                user_vote = vote_row[0]
 
-        return _poll_response(poll_id, question, yes_votes, no_votes, user_vote)
+@app.get("/poll/stream")
+async def stream_poll():
+    """Server-Sent Events: the poll payload whenever tallies change, plus heartbeats."""
+    if poll_broadcaster.value is None:
+        poll = await get_active_poll()
+        if poll is None:
+            raise HTTPException(status_code=404, detail="No poll found.")
+        broadcast_poll(poll)
+    return StreamingResponse(
+        poll_broadcaster.stream(render_poll_event),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+    )
 
 
 @app.post("/poll/vote")
-def cast_poll_vote(req: PollVoteRequest, current_user: dict = Depends(get_current_user)):
+async def cast_poll_vote(req: PollVoteRequest, current_user: dict = Depends(get_current_user)):
     if req.vote not in ("yes", "no"):
         raise HTTPException(status_code=400, detail="Vote must be 'yes' or 'no'.")
 
-    with get_db() as (conn, cur):
-        cur.execute("SELECT id FROM polls ORDER BY created_at DESC LIMIT 1")
-        row = cur.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail="No active poll.")
-
-        poll_id = row[0]
-
-        try:
-            cur.execute(
-                "INSERT INTO poll_votes (poll_id, user_id, vote) VALUES (%s, %s, %s)",
-                (poll_id, current_user["id"], req.vote),
-            )
-            if req.vote == "yes":
-                cur.execute("UPDATE polls SET yes_votes = yes_votes + 1 WHERE id = %s", (poll_id,))
-            else:
-                cur.execute("UPDATE polls SET no_votes = no_votes + 1 WHERE id = %s", (poll_id,))
-            conn.commit()
-        except psycopg2.IntegrityError:
-            conn.rollback()
-            raise HTTPException(status_code=409, detail="You have already voted in this poll.")
-
-        cur.execute("SELECT question, yes_votes, no_votes FROM polls WHERE id = %s", (poll_id,))
-        question, yes_votes, no_votes = cur.fetchone()
-        return _poll_response(poll_id, question, yes_votes, no_votes, req.vote)
+    poll = await cast_vote(current_user["id"], req.vote)
+    return poll_response(poll["id"], poll["question"], poll["yes"], poll["no"], req.vote)
 
 
 # ---------- ADMIN ----------
@@ -588,5 +625,176 @@ def verify_user(user_id: str, current_user: dict = Depends(require_superuser)):
         result = cur.fetchone()
         if not result:
             raise HTTPException(status_code=404, detail="User not found.")
+        publish_user_change(cur, user_id)
         conn.commit()
+        invalidate_user(user_id)
         return {"message": f"User {user_id} verified."}
+
+
+@app.get("/admin/db-pool")
+def get_db_pool_stats(current_user: dict = Depends(require_superuser)):
+    return {"sync": pool_stats(), "async": async_pool_stats()}
+
+
+@app.get("/admin/auth-cache")
+def get_auth_cache_stats(current_user: dict = Depends(require_superuser)):
+    return auth_cache_stats()
+
+
+@app.get("/admin/ingest")
+def get_ingest_stats(current_user: dict = Depends(require_superuser)):
+    return {"sources": source_stats(), "youtube_quota": youtube_quota}
+
+
+@app.get("/admin/comment-cache")
+def get_comment_cache_stats(current_user: dict = Depends(require_superuser)):
+    return {"cache": thread_cache.stats(), "listener": listener_stats()}
+
+
+@app.get("/admin/poll")
+def get_poll_admin_stats(current_user: dict = Depends(require_superuser)):
+    return get_poll_stats()
+
+
+@app.get("/admin/passwords")
+def get_password_pool_stats(current_user: dict = Depends(require_superuser)):
+    return get_password_stats()
+
+
+@app.get("/admin/mail")
+def get_mail_queue_stats(current_user: dict = Depends(require_superuser)):
+    return get_mail_stats()
+
+
+@app.get("/admin/uploads")
+def get_upload_pipeline_stats(current_user: dict = Depends(require_superuser)):
+    return get_upload_stats()
+
+
+@app.get("/admin/rate-limits")
+def get_rate_limiting_stats(current_user: dict = Depends(require_superuser)):
+    return get_rate_limit_stats()
+
+
+@app.get("/admin/profiling")
+def get_profiling(current_user: dict = Depends(require_superuser)):
+    return get_profiling_state()
+
+
+@app.post("/admin/profiling")
+def set_profiling(settings: ProfilingSettings, current_user: dict = Depends(require_superuser)):
+    return configure(settings.sample_rate, settings.path_prefix, settings.duration_seconds)
+
+
+@app.get("/admin/profiles")
+def get_profiles(current_user: dict = Depends(require_superuser)):
+    return list_profiles()
+
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile_detail(profile_id: str, current_user: dict = Depends(require_superuser)):
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return profile.to_dict()
+
+
+@app.get("/admin/profiles/{profile_id}/folded")
+def get_profile_folded(profile_id: str, current_user: dict = Depends(require_superuser)):
+    """Folded stacks ("frame;frame;frame count" per line) for flamegraph.pl or speedscope."""
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Profile not found.")
+    return PlainTextResponse(profile.folded())
+
+# ---------- METRICS ----------
+
+@collector
+def _pool_metrics():
+    pools = {"sync": pool_stats(), "async": async_pool_stats()}
+    yield "db_pool_connections", "gauge", "Pooled connections by state.", [
+        ({"pool": name, "state": state}, stats[state])
+        for name, stats in pools.items() for state in ("in_use", "idle")
+    ]
+    yield "db_pool_max_connections", "gauge", "Pool size limit.", [
+        ({"pool": name}, stats["max"]) for name, stats in pools.items()
+    ]
+    yield "db_pool_timeouts_total", "counter", "Checkouts that gave up waiting.", [
+        ({"pool": "sync"}, pools["sync"].get("timeouts", 0)),
+    ]
+
+
+def _age_seconds(last_updated):
+    if not last_updated:
+        return None
+    then = datetime.datetime.fromisoformat(last_updated)
+    return (datetime.datetime.now(datetime.timezone.utc) - then).total_seconds()
+
+
+@collector
+def _cache_metrics():
+    feeds = {
+        "youtube": youtube_cache, "bluesky": bluesky_cache,
+        "podcast": podcast_cache, "comments": comments_cache,
+    }
+    yield "feed_cache_items", "gauge", "Items held in each feed cache.", [
+        ({"cache": name}, len(cache["items"])) for name, cache in feeds.items()
+    ]
+    yield "feed_cache_age_seconds", "gauge", "Seconds since each feed cache last changed.", [
+        ({"cache": name}, _age_seconds(cache["last_updated"])) for name, cache in feeds.items()
+    ]
+    lookups = {**auth_cache_stats(), "comment_threads": thread_cache.stats()}
+    yield "cache_entries", "gauge", "Entries in each lookup cache.", [
+        ({"cache": name}, stats.get("size", stats.get("entries"))) for name, stats in lookups.items()
+    ]
+    for outcome in ("hits", "misses", "evictions"):
+        yield f"cache_{outcome}_total", "counter", f"Lookup cache {outcome}.", [
+            ({"cache": name}, stats[outcome]) for name, stats in lookups.items()
+        ]
+    yield "ingest_breaker_open", "gauge", "1 while a source's circuit breaker is open.", [
+        ({"source": source}, int(stats["breaker"] == "open")) for source, stats in source_stats().items()
+    ]
+
+
+@collector
+def _worker_metrics():
+    # Runs on the event loop thread (see /metrics), where anyio's limiter lives
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    ingest = executor_stats()
+    uploads = get_upload_stats()
+    passwords = get_password_stats()
+    yield "threadpool_busy", "gauge", "Busy workers per pool.", [
+        ({"pool": "request"}, limiter.borrowed_tokens),
+        ({"pool": "ingest"}, ingest["busy"]),
+        ({"pool": "upload"}, min(uploads["pending"], uploads["workers"])),
+        ({"pool": "password"}, min(passwords["outstanding"], passwords["workers"])),
+    ]
+    yield "threadpool_size", "gauge", "Worker limit per pool.", [
+        ({"pool": "request"}, limiter.total_tokens),
+        ({"pool": "ingest"}, ingest["max"]),
+        ({"pool": "upload"}, uploads["workers"]),
+        ({"pool": "password"}, passwords["workers"]),
+    ]
+    yield "threadpool_queued", "gauge", "Work waiting for a free worker.", [
+        ({"pool": "request"}, limiter.statistics().tasks_waiting),
+        ({"pool": "ingest"}, ingest["queued"]),
+        ({"pool": "upload"}, max(0, uploads["pending"] - uploads["workers"])),
+        ({"pool": "password"}, max(0, passwords["outstanding"] - passwords["workers"])),
+    ]
+    limits = get_rate_limit_stats()
+    yield "http_in_flight_requests", "gauge", "Requests currently being handled.", [({}, limits["in_flight"])]
+    yield "http_rejected_requests_total", "counter", "Requests refused before reaching a handler.", [
+        ({"reason": "rate_limited"}, limits["limited"]),
+        ({"reason": "shed"}, limits["shed"]),
+    ]
+    yield "sse_subscribers", "gauge", "Open Server-Sent Events connections.", [
+        ({"stream": "poll"}, poll_broadcaster.subscribers),
+        ({"stream": "feed"}, feed_events.subscribers),
+    ]
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if METRICS_TOKEN and request.headers.get("Authorization", "") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(status_code=401, detail="Invalid metrics token.")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
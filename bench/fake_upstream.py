@@ -0,0 +1,191 @@
+"""
+Local stand-in for the YouTube Data API, the Bluesky AppView and the Pinecast
+feed, serving the responses in bench/fixtures/ (stdlib only).
+
+    python -m bench.fake_upstream --port 9100 [--latency-ms 50]
+
+Point the API at it with:
+
+    YOUTUBE_API_URL=http://127.0.0.1:9100/youtube/v3 YOUTUBE_API_KEY=bench \
+    AID_CHANNEL_ID=UCbenchMainChannel0000001 AID_CLIPS_CHANNEL_ID=UCbenchClipsChannel000001 \
+    BLUESKY_API_URL=http://127.0.0.1:9100/xrpc BLUESKY_HANDLES=aidthompsin.bsky.social \
+    PODCAST_FEED_URL=http://127.0.0.1:9100/podcast.xml
+
+Pages chain the way the real APIs do (nextPageToken / cursor), and the
+podcast feed answers conditional requests with 304. `--record` replaces the
+fixtures with real responses, using the same env vars the API reads.
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures")
+CHANNELS = ("UCbenchMainChannel0000001", "UCbenchClipsChannel000001")
+
+
+def load_fixtures(directory: str = FIXTURES):
+    with open(os.path.join(directory, "youtube.json")) as f:
+        youtube = json.load(f)
+    with open(os.path.join(directory, "bluesky.json")) as f:
+        bluesky = json.load(f)
+    with open(os.path.join(directory, "podcast.xml"), "rb") as f:
+        podcast = f.read()
+    return youtube, bluesky, podcast
+
+
+def _by_token(pages, token_field):
+    """Map each page token (None for the first page) to its page."""
+    index = {None: pages[0]} if pages else {}
+    for page, following in zip(pages, pages[1:]):
+        index[page.get(token_field)] = following
+    return index
+
+
+class Upstream:
+    def __init__(self, youtube, bluesky, podcast, latency: float = 0.0):
+        self.channels = youtube["channels"]
+        self.playlists = {pid: _by_token(pages, "nextPageToken") for pid, pages in youtube["playlists"].items()}
+        self.feeds = {handle: _by_token(pages, "cursor") for handle, pages in bluesky.items()}
+        self.podcast = podcast
+        self.podcast_etag = '"' + hashlib.sha1(podcast).hexdigest() + '"'
+        self.latency = latency
+        self.hits = {}
+
+    def handle(self, path: str, query: dict, headers):
+        """Return (status, content_type, body, extra_headers)."""
+        self.hits[path] = self.hits.get(path, 0) + 1
+        arg = lambda name: (query.get(name) or [None])[0]
+
+        if path == "/youtube/v3/channels":
+            data = self.channels.get(arg("id"), {"items": []})
+            return 200, "application/json", json.dumps(data).encode(), {}
+        if path == "/youtube/v3/playlistItems":
+            page = self.playlists.get(arg("playlistId"), {}).get(arg("pageToken"))
+            if page is None:
+                return 404, "application/json", b'{"error": {"code": 404}}', {}
+            return 200, "application/json", json.dumps(page).encode(), {}
+        if path == "/xrpc/app.bsky.feed.getAuthorFeed":
+            page = self.feeds.get(arg("actor"), {}).get(arg("cursor"), {"feed": []})
+            return 200, "application/json", json.dumps(page).encode(), {}
+        if path == "/podcast.xml":
+            if headers.get("If-None-Match") == self.podcast_etag:
+                return 304, "application/rss+xml", b"", {"ETag": self.podcast_etag}
+            return 200, "application/rss+xml", self.podcast, {"ETag": self.podcast_etag}
+        return 404, "text/plain", b"not found", {}
+
+
+def make_handler(upstream: Upstream):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if upstream.latency:
+                time.sleep(upstream.latency)
+            status, content_type, body, extra = upstream.handle(parts.path, parse_qs(parts.query), self.headers)
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in extra.items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port: int = 9100, latency: float = 0.0, directory: str = FIXTURES):
+    """Start the fake upstream on a daemon thread; returns the server (call .shutdown() to stop)."""
+    import threading
+
+    upstream = Upstream(*load_fixtures(directory), latency=latency)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(upstream))
+    server.upstream = upstream
+    threading.Thread(target=server.serve_forever, name="fake-upstream", daemon=True).start()
+    return server
+
+
+def record(directory: str = FIXTURES, max_pages: int = 2):
+    """Overwrite the fixtures with live responses (needs network and the usual API env vars)."""
+    import requests
+
+    from config import BLUESKY_HANDLES
+    from get_youtube import YOUTUBE_API, YOUTUBE_API_KEY, AID_CHANNEL_ID, AID_CLIPS_CHANNEL_ID
+    from get_bluesky import BLUESKY_API, BACKFILL_PAGE_SIZE
+    from get_pinecast import PODCAST_FEED_URL
+
+    youtube = {"channels": {}, "playlists": {}}
+    for channel_id in (AID_CHANNEL_ID, AID_CLIPS_CHANNEL_ID):
+        channel = requests.get(f"{YOUTUBE_API}/channels", timeout=15, params={
+            "part": "contentDetails", "id": channel_id, "key": YOUTUBE_API_KEY,
+        }).json()
+        youtube["channels"][channel_id] = channel
+        playlist_id = channel["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+        pages, token = [], None
+        for _ in range(max_pages):
+            params = {"part": "snippet,contentDetails", "maxResults": 50, "playlistId": playlist_id,
+                      "key": YOUTUBE_API_KEY}
+            if token:
+                params["pageToken"] = token
+            page = requests.get(f"{YOUTUBE_API}/playlistItems", params=params, timeout=15).json()
+            pages.append(page)
+            token = page.get("nextPageToken")
+            if not token:
+                break
+        pages[-1].pop("nextPageToken", None)
+        youtube["playlists"][playlist_id] = pages
+
+    bluesky = {}
+    for handle in BLUESKY_HANDLES:
+        pages, cursor = [], None
+        for _ in range(max_pages):
+            params = {"actor": handle, "limit": BACKFILL_PAGE_SIZE, "filter": "posts_no_replies"}
+            if cursor:
+                params["cursor"] = cursor
+            page = requests.get(f"{BLUESKY_API}/app.bsky.feed.getAuthorFeed", params=params, timeout=15).json()
+            pages.append(page)
+            cursor = page.get("cursor")
+            if not cursor:
+                break
+        pages[-1].pop("cursor", None)
+        bluesky[handle] = pages
+
+    podcast = requests.get(PODCAST_FEED_URL, timeout=30).content
+
+    with open(os.path.join(directory, "youtube.json"), "w") as f:
+        json.dump(youtube, f, separators=(",", ":"))
+    with open(os.path.join(directory, "bluesky.json"), "w") as f:
+        json.dump(bluesky, f, separators=(",", ":"))
+    with open(os.path.join(directory, "podcast.xml"), "wb") as f:
+        f.write(podcast)
+    print(f"Recorded {len(youtube['channels'])} channels, {len(bluesky)} handles and the podcast feed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay added to every response")
+    parser.add_argument("--record", action="store_true", help="refresh the fixtures from the real APIs and exit")
+    args = parser.parse_args()
+
+    if args.record:
+        record()
+        return
+    server = serve(args.port, args.latency_ms / 1000)
+    print(f"Fake upstream on http://127.0.0.1:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Minimal closed-loop HTTP load generator (stdlib only).
+
+Opens `concurrency` keep-alive connections, each issuing requests back to back
+for `duration` seconds, and reports throughput and latency percentiles.
+
+    python -m bench.http_bench http://localhost:8000/poll -c 200 -d 10
+    python -m bench.http_bench http://localhost:8000/comments/youtube/abc123 -c 200 -d 10
+
+Run it against the same seeded database before and after a change to compare.
+"""
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+async def read_response(reader):
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("connection closed")
+    status = int(status_line.split()[1])
+    length = 0
+    close = False
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.strip().lower()
+        if name == "content-length":
+            length = int(value.strip())
+        elif name == "connection" and value.strip().lower() == "close":
+            close = True
+    if length:
+        await reader.readexactly(length)
+    return status, close
+
+
+async def _worker(host, port, request_fn, deadline, results):
+    reader = writer = None
+    while time.perf_counter() < deadline:
+        if writer is None:
+            reader, writer = await asyncio.open_connection(host, port)
+        payload = request_fn()
+        start = time.perf_counter()
+        try:
+            writer.write(payload)
+            await writer.drain()
+            status, close = await read_response(reader)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            results["errors"] += 1
+            writer.close()
+            writer = None
+            continue
+        results["latencies"].append(time.perf_counter() - start)
+        results["statuses"][status] = results["statuses"].get(status, 0) + 1
+        if close:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+def build_request(method, url, headers=None, body=None):
+    """Return a zero-arg callable producing raw HTTP/1.1 request bytes."""
+    parts = urlsplit(url)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    base = {"Host": parts.netloc, "Connection": "keep-alive", "Accept": "application/json"}
+    base.update(headers or {})
+
+    def make():
+        data = body() if callable(body) else body
+        if isinstance(data, (dict, list)):
+            data = json.dumps(data).encode()
+            hdrs = {**base, "Content-Type": "application/json"}
+        else:
+            hdrs = base
+        data = data or b""
+        if data or method in ("POST", "PUT", "PATCH"):
+            hdrs = {**hdrs, "Content-Length": str(len(data))}
+        head = f"{method} {path} HTTP/1.1\r\n" + "".join(f"{k}: {v}\r\n" for k, v in hdrs.items())
+        return head.encode("latin-1") + b"\r\n" + data
+
+    return make
+
+
+async def run(url, concurrency=50, duration=10.0, method="GET", headers=None, body=None):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    request_fn = build_request(method, url, headers, body)
+    results = {"latencies": [], "statuses": {}, "errors": 0}
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _worker(host, port, request_fn, deadline, results) for _ in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+    return summarize(url, results, elapsed, concurrency)
+
+
+def summarize(name, results, elapsed, concurrency):
+    lat = sorted(results["latencies"])
+    return {
+        "name": name,
+        "concurrency": concurrency,
+        "requests": len(lat),
+        "errors": results["errors"],
+        "statuses": results["statuses"],
+        "rps": round(len(lat) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(lat, 50) * 1000, 2),
+        "p95_ms": round(percentile(lat, 95) * 1000, 2),
+        "p99_ms": round(percentile(lat, 99) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("url")
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("-d", "--duration", type=float, default=10.0)
+    parser.add_argument("-X", "--method", default="GET")
+    parser.add_argument("-H", "--header", action="append", default=[], help="'Name: value'")
+    parser.add_argument("--data", help="request body (sent as-is)")
+    args = parser.parse_args()
+
+    headers = dict(h.split(":", 1) for h in args.header)
+    headers = {k.strip(): v.strip() for k, v in headers.items()}
+    body = args.data.encode() if args.data else None
+    summary = asyncio.run(run(args.url, args.concurrency, args.duration, args.method.upper(), headers, body))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Password verification throughput versus worker count.
+
+Runs `--checks` bcrypt verifications at BCRYPT_ROUNDS on a process pool of
+1, 2, 4, ... up to `--max-workers` processes and prints checks/sec for each,
+i.e. the ceiling on logins/sec one API process can sustain on this machine.
+
+    python -m bench.password_hashing --checks 200
+
+For end-to-end login numbers run http_bench against /login with
+PASSWORD_WORKERS set to each value.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from config import BCRYPT_ROUNDS
+from passwords import _hash, _check
+
+
+def worker_counts(max_workers: int):
+    n = 1
+    while n < max_workers:
+        yield n
+        n *= 2
+    yield max_workers
+
+
+def run(workers: int, checks: int, stored_hash: str):
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # start every worker before timing
+        list(pool.map(_check, ["warmup"] * workers, [stored_hash] * workers))
+        start = time.perf_counter()
+        results = list(pool.map(_check, ["benchmark"] * checks, [stored_hash] * checks))
+        elapsed = time.perf_counter() - start
+    assert all(results)
+    return checks / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--checks", type=int, default=200)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rounds", type=int, default=BCRYPT_ROUNDS)
+    args = parser.parse_args()
+
+    stored_hash = _hash("benchmark", args.rounds)
+    print(f"bcrypt cost {args.rounds}, {args.checks} checks per run")
+    baseline = None
+    for workers in worker_counts(args.max_workers):
+        rate = run(workers, args.checks, stored_hash)
+        baseline = baseline or rate
+        print(f"{workers:>3} workers  {rate:8.1f} checks/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Poll vote throughput under concurrent load.
+
+Creates a fresh poll (so it becomes the active one), then has `--voters`
+existing users each cast one vote over `--concurrency` keep-alive
+connections, and reports votes/sec and latency percentiles. Needs
+DATABASE_URL and SECRET_KEY for the database the server is using.
+
+    python -m bench.poll_votes http://localhost:8000 --voters 5000 -c 200
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import sys
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+import jwt
+import psycopg2
+
+from config import DATABASE_URL, SECRET_KEY
+from bench.http_bench import read_response, summarize
+
+
+def prepare(voters: int):
+    """Start a new poll and return up to `voters` user ids to vote with."""
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(
+                "INSERT INTO polls (question) VALUES (%s) RETURNING id",
+                (f"Benchmark poll {datetime.datetime.now().isoformat()}",),
+            )
+            poll_id = cur.fetchone()[0]
+            cur.execute("SELECT id FROM users LIMIT %s", (voters,))
+            user_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+    finally:
+        conn.close()
+    return poll_id, user_ids
+
+
+def wait_for_poll(base_url, poll_id, timeout: float = 30, confirmations: int = 10):
+    """
+    Block until GET /poll serves the new poll. The server caches the active
+    poll for POLL_CACHE_TTL, so votes sent right after prepare() would land
+    on the previous poll and come back 409. Several consecutive answers are
+    required because each uvicorn worker has its own cache.
+    """
+    deadline = time.monotonic() + timeout
+    seen = 0
+    while seen < confirmations:
+        if time.monotonic() > deadline:
+            sys.exit(f"Server did not switch to poll {poll_id} within {timeout:g}s")
+        try:
+            with urllib.request.urlopen(f"{base_url}/poll", timeout=2) as res:
+                current = json.load(res).get("poll_id")
+        except (OSError, ValueError):
+            current = None
+        if current == str(poll_id):
+            seen += 1
+        else:
+            seen = 0
+            time.sleep(0.2)
+
+
+def token_for(user_id) -> str:
+    payload = {
+        "sub": str(user_id),
+        "exp": datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=1),
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm="HS256")
+
+
+async def _voter(host, port, netloc, queue, results):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            try:
+                token = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            body = json.dumps({"vote": random.choice(("yes", "no"))}).encode()
+            request = (
+                f"POST /poll/vote HTTP/1.1\r\nHost: {netloc}\r\nConnection: keep-alive\r\n"
+                f"Authorization: Bearer {token}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n"
+            ).encode("latin-1") + body
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status, close = await read_response(reader)
+            results["latencies"].append(time.perf_counter() - start)
+            results["statuses"][status] = results["statuses"].get(status, 0) + 1
+            if close:
+                writer.close()
+                reader, writer = await asyncio.open_connection(host, port)
+    finally:
+        writer.close()
+
+
+async def run(base_url, tokens, concurrency):
+    parts = urlsplit(base_url)
+    queue = asyncio.Queue()
+    for token in tokens:
+        queue.put_nowait(token)
+    results = {"latencies": [], "statuses": {}, "errors": 0}
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _voter(parts.hostname, parts.port or 80, parts.netloc, queue, results)
+        for _ in range(concurrency)
+    ))
+    return summarize("POST /poll/vote", results, time.perf_counter() - started, concurrency)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base_url")
+    parser.add_argument("--voters", type=int, default=1000)
+    parser.add_argument("-c", "--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    poll_id, user_ids = prepare(args.voters)
+    wait_for_poll(args.base_url.rstrip("/"), poll_id)
+    tokens = [token_for(user_id) for user_id in user_ids]
+    print(f"Poll {poll_id}: {len(tokens)} voters, concurrency {args.concurrency}")
+    summary = asyncio.run(run(args.base_url, tokens, args.concurrency))
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+-- Core tables for a throwaway benchmark database, matching the columns the API uses.
+-- bench.seed applies this, then the repo's own *_setup.sql / *.sql migrations.
+
+CREATE TABLE IF NOT EXISTS public.users (
+    id uuid DEFAULT gen_random_uuid() NOT NULL PRIMARY KEY,
+    email text NOT NULL UNIQUE,
+    password_hash text NOT NULL,
+    created_at timestamp DEFAULT now() NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS public.user_profiles (
+    user_id uuid NOT NULL PRIMARY KEY REFERENCES public.users(id) ON DELETE CASCADE,
+    first_name text,
+    last_name text,
+    email text,
+    profile_picture text,
+    created_at timestamp DEFAULT now() NOT NULL,
+    verified boolean DEFAULT false NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS public.comments (
+    id uuid DEFAULT gen_random_uuid() NOT NULL PRIMARY KEY,
+    user_id uuid NOT NULL REFERENCES public.users(id) ON DELETE CASCADE,
+    target_type text NOT NULL,
+    target_id text NOT NULL,
+    content text NOT NULL,
+    author_name text,
+    author_profile_picture text,
+    created_at timestamp DEFAULT now() NOT NULL
+);
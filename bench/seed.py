@@ -0,0 +1,165 @@
+"""
+Seed a benchmark database with deterministic users, comments and poll votes.
+
+    createdb funk_bench
+    DATABASE_URL=postgresql://localhost/funk_bench python -m bench.seed --schema --users 5000 --comments 50000
+
+--schema creates the tables (bench/schema.sql plus the repo's migrations) and
+is meant for an empty database. Every seeded user has the email
+bench<N>@example.com and the password BENCH_PASSWORD. Comment threads hang
+off the videos in bench/fixtures/youtube.json, with a few hot threads and a
+long tail, like real traffic.
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import time
+import uuid
+
+import bcrypt
+import psycopg2
+import psycopg2.extras
+
+from config import DATABASE_URL, BCRYPT_ROUNDS
+
+BENCH_PASSWORD = "bench-password"
+EMAIL_PATTERN = "bench%@example.com"
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRATIONS = ("poll_setup.sql", "snapshots_setup.sql", "email_outbox.sql", "rate_limits.sql")
+INDEXES = "comments_indexes.sql"  # CREATE INDEX CONCURRENTLY: must run outside a transaction
+BATCH = 1000
+
+FIRST_NAMES = ("Aid", "Sam", "Jo", "Alex", "Priya", "Tom", "Nia", "Chris", "Mo", "Kate", "Dev", "Lou")
+PHRASES = ("Brilliant", "Cried laughing at this", "The bit at the end", "Seen this live, even better",
+           "Who else is here from the podcast?", "Absolute scenes", "More of this please", "Underrated")
+
+
+def bench_email(n: int) -> str:
+    return f"bench{n}@example.com"
+
+
+def fixture_targets():
+    with open(os.path.join(os.path.dirname(__file__), "fixtures", "youtube.json")) as f:
+        youtube = json.load(f)
+    return [
+        f"/youtube/{item['contentDetails']['videoId']}"
+        for pages in youtube["playlists"].values() for page in pages for item in page["items"]
+    ]
+
+
+def apply_schema(conn):
+    with conn.cursor() as cur:
+        with open(os.path.join(os.path.dirname(__file__), "schema.sql")) as f:
+            cur.execute(f.read())
+        for name in MIGRATIONS:
+            with open(os.path.join(REPO, name)) as f:
+                cur.execute(f.read())
+    conn.commit()
+    conn.autocommit = True
+    with conn.cursor() as cur, open(os.path.join(REPO, INDEXES)) as f:
+        for statement in f.read().split(";"):
+            if statement.strip() and not all(line.startswith("--") for line in statement.strip().splitlines()):
+                cur.execute(statement)
+    conn.autocommit = False
+
+
+def seed_users(cur, count: int, rnd: random.Random):
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode(), bcrypt.gensalt(BCRYPT_ROUNDS)).decode()
+    user_ids = []
+    for start in range(0, count, BATCH):
+        rows = [(str(uuid.UUID(int=rnd.getrandbits(128))), bench_email(n), password_hash)
+                for n in range(start, min(count, start + BATCH))]
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO users (id, email, password_hash) VALUES %s ON CONFLICT (email) DO NOTHING",
+            rows,
+        )
+        profiles = [
+            (user_id, rnd.choice(FIRST_NAMES), "Bench", email,
+             f"https://res.cloudinary.com/bench/image/upload/v1/profile_pics/{user_id}.jpg")
+            for user_id, email, _ in rows
+        ]
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO user_profiles (user_id, first_name, last_name, email, profile_picture) "
+            "VALUES %s ON CONFLICT (user_id) DO NOTHING",
+            profiles,
+        )
+        user_ids.extend(row[0] for row in rows)
+    # Re-runs keep the users that already existed; use whatever ids are actually stored
+    cur.execute("SELECT id, first_name, profile_picture FROM users JOIN user_profiles ON id = user_id "
+                "WHERE users.email LIKE %s", (EMAIL_PATTERN,))
+    return cur.fetchall()
+
+
+def seed_comments(cur, count: int, users, rnd: random.Random):
+    targets = fixture_targets()
+    # Zipf-ish: the first few videos get most of the comments
+    weights = [1 / (rank + 1) for rank in range(len(targets))]
+    now = datetime.datetime.now()
+    for start in range(0, count, BATCH):
+        rows = []
+        for _ in range(start, min(count, start + BATCH)):
+            user_id, first_name, picture = rnd.choice(users)
+            rows.append((
+                str(uuid.UUID(int=rnd.getrandbits(128))), user_id, "youtube",
+                rnd.choices(targets, weights)[0], rnd.choice(PHRASES), first_name, picture,
+                now - datetime.timedelta(seconds=rnd.randint(0, 90 * 86400)),
+            ))
+        psycopg2.extras.execute_values(
+            cur,
+            "INSERT INTO comments (id, user_id, target_type, target_id, content, author_name, "
+            "author_profile_picture, created_at) VALUES %s",
+            rows,
+        )
+
+
+def seed_poll(cur, votes: int, users, rnd: random.Random):
+    cur.execute("INSERT INTO polls (question) VALUES (%s) RETURNING id", ("Benchmark seed poll",))
+    poll_id = cur.fetchone()[0]
+    rows = [(poll_id, user_id, rnd.choice(("yes", "no"))) for user_id, _, _ in users[:votes]]
+    psycopg2.extras.execute_values(cur, "INSERT INTO poll_votes (poll_id, user_id, vote) VALUES %s", rows)
+    cur.execute(
+        """
+        UPDATE polls SET
+            yes_votes = (SELECT count(*) FROM poll_votes WHERE poll_id = %(id)s AND vote = 'yes'),
+            no_votes = (SELECT count(*) FROM poll_votes WHERE poll_id = %(id)s AND vote = 'no')
+        WHERE id = %(id)s
+        """,
+        {"id": poll_id},
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--schema", action="store_true", help="create the tables first (empty database)")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--comments", type=int, default=20000)
+    parser.add_argument("--votes", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=27, help="random seed")
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    started = time.perf_counter()
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        if args.schema:
+            apply_schema(conn)
+        with conn.cursor() as cur:
+            users = seed_users(cur, args.users, rnd)
+            seed_comments(cur, args.comments, users, rnd)
+            seed_poll(cur, min(args.votes, len(users)), users, rnd)
+        conn.commit()
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Seeded {len(users)} users, {args.comments} comments, {min(args.votes, len(users))} votes "
+          f"in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+End-to-end benchmark suite: scripted scenarios against a running API, with
+per-endpoint throughput and p50/p95/p99, and a regression check against a
+saved baseline.
+
+Against a server you started yourself (seeded with bench.seed, upstreams
+pointed at bench.fake_upstream, RATE_LIMIT_ENABLED=false):
+
+    python -m bench.suite http://localhost:8000 -d 10 --save bench/baseline.json
+
+Or let the suite start the fake upstream and uvicorn itself (still needs
+DATABASE_URL for a seeded database):
+
+    python -m bench.suite --spawn --workers 2 --baseline bench/baseline.json --threshold 0.15
+
+Exits non-zero if any scenario's p95 rose, or its throughput fell, by more
+than --threshold relative to the baseline, or if more than 1% of its
+requests failed.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+
+import psycopg2
+
+from config import DATABASE_URL
+from bench.fake_upstream import CHANNELS, serve
+from bench.http_bench import run
+from bench.poll_votes import prepare, wait_for_poll, token_for, run as run_votes
+from bench.seed import BENCH_PASSWORD, EMAIL_PATTERN
+
+MAX_ERROR_RATE = 0.01
+
+
+def load_context(sample: int = 500):
+    """Seeded users and the busiest comment thread, read from DATABASE_URL."""
+    conn = psycopg2.connect(DATABASE_URL)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, email FROM users WHERE email LIKE %s ORDER BY email LIMIT %s",
+                        (EMAIL_PATTERN, sample))
+            users = cur.fetchall()
+            cur.execute("SELECT target_id FROM comments GROUP BY target_id ORDER BY count(*) DESC LIMIT 1")
+            hot = cur.fetchone()
+    finally:
+        conn.close()
+    if not users or not hot:
+        sys.exit("No seeded data found; run python -m bench.seed first.")
+    return {"users": users, "hot_thread": hot[0], "token": token_for(users[0][0])}
+
+
+def scenarios(ctx):
+    """name -> (method, path, headers, body); body may be a callable for per-request bodies."""
+    auth = {"Authorization": f"Bearer {ctx['token']}"}
+    logins = itertools.cycle(email for _, email in ctx["users"])
+    return {
+        "feed": ("GET", "/feed?page=1", None, None),
+        "youtube": ("GET", "/youtube?page=1", None, None),
+        "comments": ("GET", f"/comments{ctx['hot_thread']}", None, None),
+        "poll": ("GET", "/poll", auth, None),
+        "me": ("GET", "/me", auth, None),
+        "login": ("POST", "/login", None, lambda: {"email": next(logins), "password": BENCH_PASSWORD}),
+    }
+
+
+def spawn_server(port: int, workers: int, upstream_port: int):
+    """Start the fake upstream in-process and uvicorn as a child process; wait until it serves."""
+    serve(upstream_port)
+    upstream = f"http://127.0.0.1:{upstream_port}"
+    env = {
+        **os.environ,
+        "YOUTUBE_API_URL": f"{upstream}/youtube/v3",
+        "YOUTUBE_API_KEY": "bench",
+        "AID_CHANNEL_ID": CHANNELS[0],
+        "AID_CLIPS_CHANNEL_ID": CHANNELS[1],
+        "BLUESKY_API_URL": f"{upstream}/xrpc",
+        "BLUESKY_HANDLES": "aidthompsin.bsky.social",
+        "PODCAST_FEED_URL": f"{upstream}/podcast.xml",
+        "RATE_LIMIT_ENABLED": "false",
+        "SNAPSHOT_DIR": ".cache/bench-snapshots",
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning"],
+        env=env,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/feed?page=1", timeout=2) as res:
+                if json.load(res).get("items"):
+                    return process, base_url
+        except (OSError, ValueError):
+            pass
+        if process.poll() is not None:
+            sys.exit("uvicorn exited during startup")
+        time.sleep(0.5)
+    process.terminate()
+    sys.exit("Server did not serve a populated feed within 60s")
+
+
+def compare(results, baseline, threshold):
+    """Return a list of human-readable regressions."""
+    problems = []
+    for name, result in results.items():
+        failed = result["errors"] + sum(n for status, n in result["statuses"].items() if int(status) >= 400)
+        total = result["requests"] + result["errors"]
+        if total and failed / total > MAX_ERROR_RATE:
+            problems.append(f"{name}: {failed}/{total} requests failed ({result['statuses']})")
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base["p95_ms"] and result["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            problems.append(f"{name}: p95 {result['p95_ms']}ms vs baseline {base['p95_ms']}ms")
+        if base["rps"] and result["rps"] < base["rps"] * (1 - threshold):
+            problems.append(f"{name}: {result['rps']} req/s vs baseline {base['rps']} req/s")
+    return problems
+
+
+def print_table(results, baseline):
+    print(f"{'scenario':<12}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}  vs baseline p95")
+    for name, r in results.items():
+        base = baseline.get(name)
+        delta = f"{(r['p95_ms'] / base['p95_ms'] - 1) * 100:+.1f}%" if base and base["p95_ms"] else ""
+        print(f"{name:<12}{r['rps']:>10}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['errors']:>8}  {delta}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base_url", nargs="?", default="http://127.0.0.1:8000")
+    parser.add_argument("-c", "--concurrency", type=int, default=50)
+    parser.add_argument("-d", "--duration", type=float, default=10.0, help="seconds per scenario")
+    parser.add_argument("--only", action="append", help="run just these scenarios (repeatable)")
+    parser.add_argument("--voters", type=int, default=1000, help="one-shot votes for the poll_vote scenario; 0 skips")
+    parser.add_argument("--save", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative regression")
+    parser.add_argument("--spawn", action="store_true", help="start fake upstream + uvicorn")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--upstream-port", type=int, default=9100)
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["scenarios"]
+
+    process = None
+    base_url = args.base_url.rstrip("/")
+    if args.spawn:
+        process, base_url = spawn_server(args.port, args.workers, args.upstream_port)
+
+    results = {}
+    try:
+        ctx = load_context()
+        for name, (method, path, headers, body) in scenarios(ctx).items():
+            if args.only and name not in args.only:
+                continue
+            print(f"Running {name} for {args.duration:g}s ...", flush=True)
+            results[name] = asyncio.run(
+                run(base_url + path, args.concurrency, args.duration, method, headers, body)
+            )
+        if args.voters and (not args.only or "poll_vote" in args.only):
+            print(f"Running poll_vote with {args.voters} voters ...", flush=True)
+            poll_id, user_ids = prepare(args.voters)
+            wait_for_poll(base_url, poll_id)
+            results["poll_vote"] = asyncio.run(
+                run_votes(base_url, [token_for(user_id) for user_id in user_ids], args.concurrency)
+            )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    print_table(results, baseline)
+    if any(429 in r["statuses"] for r in results.values()):
+        print("Note: got 429s; run the server with RATE_LIMIT_ENABLED=false for benchmarks.")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "concurrency": args.concurrency,
+                "duration": args.duration,
+                "scenarios": results,
+            }, f, indent=2)
+        print(f"Saved results to {args.save}")
+
+    problems = compare(results, baseline, args.threshold)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
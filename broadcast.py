@@ -0,0 +1,165 @@
+"""
+In-process fan-out for Server-Sent Events.
+
+A Broadcaster holds the latest published value and a version number. Every
+subscriber is a coroutine waiting on one shared asyncio.Event, so thousands of
+idle connections cost one small object each and no threads. Subscribers wake
+at most `max_rate` times per second and always receive the latest value, so a
+burst of publishes collapses into a single update.
+"""
+import uuid
+import asyncio
+from collections import deque
+import orjson
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(data, event: str = None, event_id=None) -> bytes:
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append("data: " + orjson.dumps(data).decode("utf-8"))
+    return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+SSE_HEARTBEAT = b": ping\n\n"
+
+
+class Broadcaster:
+    def __init__(self, max_rate: float, heartbeat: float):
+        self.min_interval = 1.0 / max_rate
+        self.heartbeat = heartbeat
+        self.value = None
+        self.version = 0
+        self.subscribers = 0
+        self.published = 0
+        self._changed = None
+        self._loop = None
+
+    def bind(self, loop=None):
+        """Remember the event loop so publish() can be called from other threads."""
+        self._loop = loop or asyncio.get_running_loop()
+        self._changed = asyncio.Event()
+
+    def publish(self, value):
+        if self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._publish(value)
+        else:
+            self._loop.call_soon_threadsafe(self._publish, value)
+
+    def _publish(self, value):
+        self.value = value
+        self.version += 1
+        self.published += 1
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self, seen_version: int):
+        """Wait until there's a version newer than seen_version, or the heartbeat interval passes."""
+        if self.version != seen_version:
+            return True
+        changed = self._changed
+        try:
+            await asyncio.wait_for(changed.wait(), self.heartbeat)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    async def stream(self, render):
+        """
+        Async generator of SSE bytes for one subscriber: the current value
+        immediately, then at most max_rate updates per second, with heartbeats
+        while idle. `render(value, version)` turns a value into bytes (or None to skip).
+        """
+        self.subscribers += 1
+        try:
+            seen = self.version
+            if self.value is not None:
+                chunk = render(self.value, seen)
+                if chunk:
+                    yield chunk
+            while True:
+                if await self.wait(seen):
+                    seen = self.version
+                    chunk = render(self.value, seen)
+                    if chunk:
+                        yield chunk
+                    await asyncio.sleep(self.min_interval)  # coalesce bursts
+                else:
+                    yield SSE_HEARTBEAT
+        finally:
+            self.subscribers -= 1
+
+    def stats(self):
+        return {"subscribers": self.subscribers, "published": self.published, "version": self.version}
+
+
+class EventLog(Broadcaster):
+    """
+    A Broadcaster that keeps the last `history` published values so a
+    reconnecting subscriber can resume from the token of the last event it saw.
+    Tokens are "<epoch>-<version>"; the epoch changes with every process, so a
+    token from another worker or before a restart is detected and answered
+    with a reset instead of silently skipping events.
+    """
+
+    def __init__(self, max_rate: float, heartbeat: float, history: int):
+        super().__init__(max_rate, heartbeat)
+        self.epoch = uuid.uuid4().hex[:8]
+        self.history = deque(maxlen=history)
+
+    def _publish(self, value):
+        super()._publish(value)
+        self.history.append((self.version, value))
+
+    def token(self, version: int) -> str:
+        return f"{self.epoch}-{version}"
+
+    def parse_token(self, token: str):
+        """Version a token refers to, or None if it can't be resumed from."""
+        epoch, _, version = (token or "").partition("-")
+        if epoch != self.epoch or not version.isdigit():
+            return None
+        version = int(version)
+        oldest = self.history[0][0] if self.history else self.version + 1
+        if version > self.version or version < oldest - 1:
+            return None
+        return version
+
+    def since(self, version: int, upto: int):
+        return [value for v, value in self.history if version < v <= upto]
+
+    async def stream(self, render, resume_token: str = None):
+        """
+        Async generator of SSE bytes. `render(values, token)` turns the values
+        published since the subscriber's last event into one event; it is
+        called with values=None when the subscriber must reset (reload from
+        scratch) because its token can't be resumed.
+        """
+        self.subscribers += 1
+        try:
+            seen = self.parse_token(resume_token) if resume_token else self.version
+            if seen is None:
+                seen = self.version
+                yield render(None, self.token(seen))
+            while True:
+                if self.version != seen or await self.wait(seen):
+                    current = self.version
+                    values = self.since(seen, current)
+                    seen = current
+                    if values:
+                        yield render(values, self.token(seen))
+                    await asyncio.sleep(self.min_interval)  # coalesce bursts
+                else:
+                    yield SSE_HEARTBEAT
+        finally:
+            self.subscribers -= 1
@@ -0,0 +1,142 @@
+import base64
+import binascii
+import datetime
+import threading
+import uuid
+import orjson
+from fastapi import HTTPException
+from cache import SizedLRUCache
+from config import COMMENT_CACHE_ENTRIES, COMMENT_CACHE_BYTES
+from db import get_async_db
+from storage import avatar_url
+import notify
+
+COMMENTS_PAGE_SIZE = 50
+COMMENTS_MAX_PAGE_SIZE = 100
+
+# target_id -> {(limit, cursor): (page, serialized size)}
+thread_cache = SizedLRUCache(max_entries=COMMENT_CACHE_ENTRIES, max_bytes=COMMENT_CACHE_BYTES)
+
+# target_id -> invalidation count. A page read from the DB is only cached if
+# its thread wasn't invalidated meanwhile, so a slow reader can't re-insert
+# a thread from before the latest comment.
+_generations = {}
+_epoch = 0  # bumped when every thread is invalidated at once
+_generations_lock = threading.Lock()
+
+
+def _generation(target_id):
+    return _epoch, _generations.get(target_id, 0)
+
+
+def invalidate_thread(target_id):
+    """Drop a thread's cached pages. target_id=None drops every thread."""
+    global _epoch
+    with _generations_lock:
+        if target_id is None:
+            _epoch += 1
+            thread_cache.clear()
+            return
+        _generations[target_id] = _generations.get(target_id, 0) + 1
+        thread_cache.pop(target_id)
+
+
+def publish_thread_change(cur, target_id: str):
+    """
+    Call inside the transaction that inserts a comment. Every process, this
+    one included, drops its cached copy of the thread when it commits.
+    """
+    notify.notify(cur, notify.COMMENTS_CHANNEL, target_id)
+
+
+notify.on(notify.COMMENTS_CHANNEL, invalidate_thread)
+
+
+def encode_cursor(created_at: datetime.datetime, comment_id) -> str:
+    """Opaque keyset cursor pointing just past (created_at, id)."""
+    raw = orjson.dumps([created_at.isoformat(), str(comment_id)])
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, comment_id = orjson.loads(raw)
+        return datetime.datetime.fromisoformat(created_at), uuid.UUID(comment_id)
+    except (binascii.Error, ValueError, TypeError, AttributeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+
+async def fetch_thread_page(target_id: str, limit: int = COMMENTS_PAGE_SIZE, cursor: str = None):
+    """
+    One page of a comment thread, newest first, served from the hot thread
+    cache when possible.
+    """
+    limit = min(limit, COMMENTS_MAX_PAGE_SIZE)
+    page_key = (limit, cursor)
+    # Reject a bad cursor with a 400 before touching the cache or the DB
+    before = decode_cursor(cursor) if cursor else None
+
+    cached = thread_cache.get_in(target_id, page_key)
+    if cached is not None:
+        return cached[0]
+
+    generation = _generation(target_id)
+    page = await _query_thread_page(target_id, limit, before)
+
+    with _generations_lock:
+        if _generation(target_id) == generation:
+            pages = dict(thread_cache.peek(target_id) or {})
+            pages[page_key] = (page, len(orjson.dumps(page)))
+            thread_cache.set(target_id, pages, sum(size for _, size in pages.values()))
+    return page
+
+
+async def _query_thread_page(target_id: str, limit: int, before=None):
+    """
+    Keyset pagination on (created_at, id), so every page costs the same
+    however long the thread is. `before` is a decoded cursor.
+    """
+    async with get_async_db() as conn:
+        if before:
+            before_created_at, before_id = before
+            rows = await conn.fetch(
+                """
+                SELECT id, user_id, content, created_at, author_name, author_profile_picture
+                FROM comments
+                WHERE target_id = $1 AND (created_at, id) < ($2, $3)
+                ORDER BY created_at DESC, id DESC
+                LIMIT $4
+                """,
+                target_id, before_created_at, before_id, limit + 1,
+            )
+        else:
+            rows = await conn.fetch(
+                """
+                SELECT id, user_id, content, created_at, author_name, author_profile_picture
+                FROM comments
+                WHERE target_id = $1
+                ORDER BY created_at DESC, id DESC
+                LIMIT $2
+                """,
+                target_id, limit + 1,
+            )
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"])
+
+    return {
+        "comments": [
+            {
+                "user_id": str(row["user_id"]),
+                "content": row["content"],
+                "created_at": row["created_at"].isoformat(),
+                "author_name": row["author_name"],
+                "author_profile_picture": avatar_url(row["author_profile_picture"]),
+            }
+            for row in rows
+        ],
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,14 @@
+-- Indexes for keyset-paginated comment threads and recent activity
+-- Run this against your PostgreSQL database (CONCURRENTLY: don't wrap in a transaction)
+
+-- /comments/{target_type}/{target_id}: WHERE target_id = ? ORDER BY created_at DESC, id DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS comments_target_created_idx
+    ON public.comments (target_id, created_at DESC, id DESC);
+
+-- /comments/me and /recent_activity/{user_id}: WHERE user_id = ? ORDER BY created_at DESC
+CREATE INDEX CONCURRENTLY IF NOT EXISTS comments_user_created_idx
+    ON public.comments (user_id, created_at DESC);
+
+-- Feed comments (feed.refresh_comments_cache): newest comments across all threads
+CREATE INDEX CONCURRENTLY IF NOT EXISTS comments_created_idx
+    ON public.comments (created_at DESC, id DESC);
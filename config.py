@@ -4,4 +4,93 @@ import os
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
-SECRET_KEY = os.getenv("SECRET_KEY")
\ No newline at end of file
+SECRET_KEY = os.getenv("SECRET_KEY")
+
+# Per-process Postgres connection pool (see db.get_db)
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "5"))          # seconds to wait for a free connection
+DB_POOL_MAX_AGE = float(os.getenv("DB_POOL_MAX_AGE", "1800"))       # recycle connections older than this
+DB_POOL_CHECK_IDLE = float(os.getenv("DB_POOL_CHECK_IDLE", "30"))   # ping connections idle longer than this
+
+# asyncpg pool used by the async handlers (see db.get_async_db)
+ASYNC_DB_POOL_MIN = int(os.getenv("ASYNC_DB_POOL_MIN", "2"))
+ASYNC_DB_POOL_MAX = int(os.getenv("ASYNC_DB_POOL_MAX", "20"))
+ASYNC_DB_POOL_IDLE_LIFETIME = float(os.getenv("ASYNC_DB_POOL_IDLE_LIFETIME", "300"))  # close connections idle this long
+# DB_POOL_MAX_AGE applies here too: connections older than it are closed on release
+
+# Authenticated-user caches (see util.get_current_user)
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "300"))
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "20000"))
+
+# Cache ingestion: "inline" runs the refresh jobs inside each API process (single
+# worker / local dev); "external" leaves them to `python -m ingest` and API workers
+# only pick up the snapshots it publishes.
+INGEST_MODE = os.getenv("INGEST_MODE", "inline")
+SNAPSHOT_POLL_SECONDS = float(os.getenv("SNAPSHOT_POLL_SECONDS", "15"))
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", ".cache/snapshots")  # local warm-start copies of each cache
+
+# Bluesky ingestion (see get_bluesky.fetch_all_bluesky)
+BLUESKY_HANDLES = [h.strip() for h in os.getenv("BLUESKY_HANDLES", "aidthompsin.bsky.social").split(",") if h.strip()]
+BLUESKY_MAX_POSTS = int(os.getenv("BLUESKY_MAX_POSTS", "1000"))          # size of the in-memory post store
+BLUESKY_REFRESH_MINUTES = float(os.getenv("BLUESKY_REFRESH_MINUTES", "10"))
+
+# Hot comment thread cache (see comments.fetch_thread_page)
+COMMENT_CACHE_ENTRIES = int(os.getenv("COMMENT_CACHE_ENTRIES", "2000"))
+COMMENT_CACHE_BYTES = int(os.getenv("COMMENT_CACHE_BYTES", str(32 * 1024 * 1024)))
+
+# Active poll cache and write-behind vote counters (see poll.py)
+POLL_CACHE_TTL = float(os.getenv("POLL_CACHE_TTL", "2"))            # seconds between re-reads of the polls row
+POLL_FLUSH_INTERVAL = float(os.getenv("POLL_FLUSH_INTERVAL", "1"))  # seconds between counter flushes
+
+# Server-Sent Events (see broadcast.py)
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+POLL_STREAM_MAX_RATE = float(os.getenv("POLL_STREAM_MAX_RATE", "2"))   # updates per second per subscriber
+FEED_STREAM_MAX_RATE = float(os.getenv("FEED_STREAM_MAX_RATE", "1"))
+FEED_STREAM_HISTORY = int(os.getenv("FEED_STREAM_HISTORY", "500"))    # update batches kept for resuming clients
+
+# Password hashing (see passwords.py)
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))                 # changing it rehashes users on next login
+PASSWORD_WORKERS = int(os.getenv("PASSWORD_WORKERS", str(os.cpu_count() or 1)))
+PASSWORD_QUEUE_LIMIT = int(os.getenv("PASSWORD_QUEUE_LIMIT", str(PASSWORD_WORKERS * 4)))  # in-flight + queued
+
+# Outbound mail (see mailer.py). For local testing point SMTP_HOST/SMTP_PORT at a
+# stand-in such as `python -m aiosmtpd -n -l localhost:1025` with SMTP_SSL=false.
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.titan.email")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+SMTP_SSL = os.getenv("SMTP_SSL", "true").lower() == "true"
+SMTP_USER = os.getenv("SMTP_USER", "aid@funk-27.co.uk")     # empty: don't log in
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", os.getenv("TITAN_PW"))
+MAIL_FROM = os.getenv("MAIL_FROM", "aid@funk-27.co.uk")
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "8"))       # then the row is left for inspection
+MAIL_POLL_SECONDS = float(os.getenv("MAIL_POLL_SECONDS", "30"))    # fallback when a notification is missed
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))    # close the connection after this long unused
+MAIL_RETENTION_DAYS = float(os.getenv("MAIL_RETENTION_DAYS", "7"))  # sent and dead rows are deleted after this
+
+# Profile picture uploads (see uploads.py)
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(5 * 1024 * 1024)))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))          # concurrent uploads to the image host
+UPLOAD_MAX_PENDING = int(os.getenv("UPLOAD_MAX_PENDING", "32"))  # queued + running before new uploads get 503
+
+# Image storage (see storage.py): "cloudinary", or "local" to keep resized
+# copies under MEDIA_DIR and serve them from /media
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "cloudinary")
+MEDIA_DIR = os.getenv("MEDIA_DIR", "uploads/media")
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "")   # e.g. https://api.funk-27.co.uk; empty gives /media/... paths
+
+# Rate limiting and load shedding (see ratelimit.py)
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")   # "postgres" shares buckets across workers
+FORWARDED_HOPS = int(os.getenv("FORWARDED_HOPS", "1"))           # proxies in front that append X-Forwarded-For; 0 = none
+MAX_IN_FLIGHT = int(os.getenv("MAX_IN_FLIGHT", "256"))           # concurrent requests per process before 503s
+
+# /metrics (see metrics.py); when set, scrapers must send "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# On-demand request profiling (see profiling.py)
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "2"))   # stack sampling period
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))                  # finished profiles kept for /admin/profiles
+PROFILE_MAX_QUERIES = int(os.getenv("PROFILE_MAX_QUERIES", "500"))  # per profile; the rest are only counted
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "30"))  # sampling stops and the profile is stored after this
@@ -1,14 +1,362 @@
+import os
+import time
+import asyncio
+import threading
+import asyncpg
 import psycopg2
-from contextlib import contextmanager
-from config import DATABASE_URL, SECRET_KEY
+import psycopg2.extensions
+from contextlib import contextmanager, asynccontextmanager
+from config import (
+    DATABASE_URL, SECRET_KEY,
+    DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT, DB_POOL_MAX_AGE, DB_POOL_CHECK_IDLE,
+    ASYNC_DB_POOL_MIN, ASYNC_DB_POOL_MAX, ASYNC_DB_POOL_IDLE_LIFETIME,
+)
+from metrics import db_query_seconds, db_pool_wait_seconds, query_label
+from profiling import current_profile
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes free within DB_POOL_TIMEOUT."""
+
+
+class ConnectionPool:
+    """
+    Thread-safe psycopg2 connection pool.
+    Connections are health-checked on checkout when they have been idle for a
+    while, recycled once older than max_age, and checkout waits at most
+    `timeout` seconds before raising PoolTimeout.
+    """
+
+    def __init__(self, dsn, minconn, maxconn, timeout, max_age, check_idle):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_age = max_age
+        self.check_idle = check_idle
+
+        self._cond = threading.Condition()
+        self._idle = []        # [(conn, created_at, returned_at)], most recently used last
+        self._created = {}     # id(conn) -> created_at, for checked-out connections
+        self._size = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "connects": 0,
+            "recycled": 0,
+            "failed_checks": 0,
+        }
+
+        for _ in range(minconn):
+            conn = self._connect()
+            self._idle.append((conn, time.monotonic(), time.monotonic()))
+            self._size += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn)
+        self._stats["connects"] += 1
+        return conn
+
+    def _is_usable(self, conn, created_at, returned_at):
+        now = time.monotonic()
+        if conn.closed:
+            return False
+        if now - created_at > self.max_age:
+            self._stats["recycled"] += 1
+            return False
+        if now - returned_at > self.check_idle:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                self._stats["failed_checks"] += 1
+                return False
+        return True
+
+    def getconn(self):
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            waited = False
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed.")
+                if self._idle:
+                    conn, created_at, returned_at = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(
+                        f"Timed out after {self.timeout}s waiting for a database connection "
+                        f"({self.maxconn} in use)."
+                    )
+                if not waited:
+                    self._stats["waits"] += 1
+                    waited = True
+                self._cond.wait(remaining)
+            self._stats["checkouts"] += 1
+
+        # Network I/O happens outside the lock
+        if conn is not None and not self._is_usable(conn, created_at, returned_at):
+            # Keep the slot reserved and replace the connection in place
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+            conn = None
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            created_at = time.monotonic()
+
+        with self._cond:
+            self._created[id(conn)] = created_at
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if not discard and not conn.closed:
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                # Handlers commit explicitly; anything left open is rolled back
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        with self._cond:
+            created_at = self._created.pop(id(conn), time.monotonic())
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+                self._cond.notify()
+            else:
+                self._idle.append((conn, created_at, time.monotonic()))
+                self._cond.notify()
+                return
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _, _ in idle:
+            try:
+                conn.close()
+            except psycopg2.Error:
+                pass
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min": self.minconn,
+                "max": self.maxconn,
+                **self._stats,
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return this process's pool, creating it lazily (and again after a fork)."""
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ConnectionPool(
+                    DATABASE_URL,
+                    minconn=DB_POOL_MIN,
+                    maxconn=DB_POOL_MAX,
+                    timeout=DB_POOL_TIMEOUT,
+                    max_age=DB_POOL_MAX_AGE,
+                    check_idle=DB_POOL_CHECK_IDLE,
+                )
+                _pool_pid = pid
+    return _pool
+
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool_pid == os.getpid():
+            _pool.closeall()
+        _pool = None
+
+
+def pool_stats():
+    if _pool is None or _pool_pid != os.getpid():
+        return {"size": 0, "idle": 0, "in_use": 0, "min": DB_POOL_MIN, "max": DB_POOL_MAX}
+    return _pool.stats()
+
+
+class TimedCursor(psycopg2.extensions.cursor):
+    """
+    Cursor that records each statement's duration in db_query_seconds, and
+    in the request's profile when one is being taken.
+    """
+
+    def _record(self, query, elapsed):
+        db_query_seconds.observe(elapsed, "sync", query_label(query))
+        profile = current_profile.get()
+        if profile is not None:
+            profile.add_query(query, elapsed, self.rowcount)
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            self._record(query, time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            self._record(query, time.perf_counter() - start)
 
 
 @contextmanager
 def get_db():
-    conn = psycopg2.connect(DATABASE_URL)
-    cur = conn.cursor()
+    pool = get_pool()
+    with db_pool_wait_seconds.time("sync"):
+        conn = pool.getconn()
+    cur = conn.cursor(cursor_factory=TimedCursor)
+    broken = False
     try:
         yield conn, cur
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
     finally:
-        cur.close()
-        conn.close()
+        try:
+            cur.close()
+        except psycopg2.Error:
+            pass
+        pool.putconn(conn, discard=broken or conn.closed)
+
+
+# ---------- ASYNC (asyncpg) ----------
+# Used by the async def handlers so they don't tie up a threadpool thread per query.
+# Queries use $1, $2 ... placeholders and return asyncpg Records.
+
+_async_pool = None
+# server backend pid -> when the connection was opened, for DB_POOL_MAX_AGE
+_async_created = {}
+_async_recycled = 0
+_async_pool_lock = None
+
+
+def _log_async_query(record):
+    # Called via loop.call_soon from the querying task, so its context (and profile) carries over
+    db_query_seconds.observe(record.elapsed, "async", query_label(record.query))
+    profile = current_profile.get()
+    if profile is not None:
+        profile.add_query(record.query, record.elapsed, None)
+
+
+async def _init_async_connection(conn):
+    conn.add_query_logger(_log_async_query)
+    pid = conn.get_server_pid()
+    _async_created[pid] = time.monotonic()
+    # Idle-lifetime closes and dropped connections forget their entry too
+    conn.add_termination_listener(lambda _: _async_created.pop(pid, None))
+
+
+async def get_async_pool():
+    global _async_pool, _async_pool_lock
+    if _async_pool is None:
+        if _async_pool_lock is None:
+            _async_pool_lock = asyncio.Lock()
+        async with _async_pool_lock:
+            if _async_pool is None:
+                _async_pool = await asyncpg.create_pool(
+                    DATABASE_URL,
+                    min_size=ASYNC_DB_POOL_MIN,
+                    max_size=ASYNC_DB_POOL_MAX,
+                    max_inactive_connection_lifetime=ASYNC_DB_POOL_IDLE_LIFETIME,
+                    init=_init_async_connection,
+                )
+    return _async_pool
+
+
+async def close_async_pool():
+    global _async_pool
+    if _async_pool is not None:
+        pool, _async_pool = _async_pool, None
+        await pool.close()
+
+
+def async_pool_stats():
+    if _async_pool is None:
+        return {"size": 0, "idle": 0, "in_use": 0, "min": ASYNC_DB_POOL_MIN, "max": ASYNC_DB_POOL_MAX}
+    size = _async_pool.get_size()
+    idle = _async_pool.get_idle_size()
+    return {
+        "size": size,
+        "idle": idle,
+        "in_use": size - idle,
+        "min": _async_pool.get_min_size(),
+        "max": _async_pool.get_max_size(),
+        "recycled": _async_recycled,
+    }
+
+
+@asynccontextmanager
+async def get_async_db():
+    pool = await get_async_pool()
+    start = time.perf_counter()
+    try:
+        conn = await pool.acquire(timeout=DB_POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise PoolTimeout(
+            f"Timed out after {DB_POOL_TIMEOUT}s waiting for a database connection "
+            f"({ASYNC_DB_POOL_MAX} in use)."
+        )
+    finally:
+        db_pool_wait_seconds.observe(time.perf_counter() - start, "async")
+    try:
+        yield conn
+    finally:
+        await _release_async(pool, conn)
+
+
+async def _release_async(pool, conn):
+    """Return a connection, closing it instead once it's older than DB_POOL_MAX_AGE (like the sync pool)."""
+    global _async_recycled
+    pid = conn.get_server_pid()
+    created_at = _async_created.get(pid)
+    if created_at is not None and time.monotonic() - created_at > DB_POOL_MAX_AGE and not conn.is_in_transaction():
+        _async_created.pop(pid, None)
+        _async_recycled += 1
+        try:
+            # Closing hands the slot back to the pool, which reconnects on a later acquire
+            await conn.close(timeout=5)
+        except Exception as e:
+            print(f"Error closing recycled async connection: {e}")
+        return
+    await pool.release(conn)
@@ -0,0 +1,18 @@
+-- Durable outbound mail queue drained by mailer.MailSender
+-- Run this against your PostgreSQL database
+
+CREATE TABLE public.email_outbox (
+    id bigserial PRIMARY KEY,
+    to_addr text NOT NULL,
+    reply_to text,
+    subject text NOT NULL,
+    body text NOT NULL,
+    attempts integer DEFAULT 0 NOT NULL,
+    next_attempt_at timestamptz DEFAULT now() NOT NULL,
+    last_error text,
+    created_at timestamptz DEFAULT now() NOT NULL,
+    sent_at timestamptz
+);
+
+-- Only unsent rows are ever scanned by the sender
+CREATE INDEX email_outbox_due_idx ON public.email_outbox (next_attempt_at) WHERE sent_at IS NULL;
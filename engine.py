@@ -0,0 +1,192 @@
+"""
+Shared machinery for the cache refresh jobs: pooled keep-alive HTTP sessions
+per upstream, per-source timeouts with jittered retry/backoff, circuit breakers,
+a thread pool for running fetches concurrently, and per-source timings.
+"""
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import ingest_job_seconds
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# Per-source overrides; anything missing falls back to DEFAULT_SETTINGS
+DEFAULT_SETTINGS = {
+    "timeout": 10,            # seconds per HTTP attempt
+    "retries": 2,             # extra attempts after the first
+    "backoff": 0.5,           # base delay, doubled per attempt, jittered
+    "failure_threshold": 3,   # consecutive failed refreshes before the breaker opens
+    "reset_timeout": 600,     # seconds the breaker stays open before a trial refresh
+}
+SOURCE_SETTINGS = {
+    "youtube": {},
+    "bluesky": {"timeout": 8},
+    "podcast": {"timeout": 15},
+    "comments": {"retries": 0},
+}
+
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="ingest")
+
+
+def settings_for(source: str) -> dict:
+    return {**DEFAULT_SETTINGS, **SOURCE_SETTINGS.get(source, {})}
+
+
+class CircuitBreaker:
+    """
+    Closed: refreshes run. After `failure_threshold` consecutive failures it
+    opens and refreshes are skipped, so the cache keeps its last good data.
+    After `reset_timeout` one trial refresh is allowed (half-open).
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class SourceClient:
+    """A keep-alive requests.Session for one upstream, with timeout and retry policy."""
+
+    def __init__(self, source: str):
+        settings = settings_for(source)
+        self.source = source
+        self.timeout = settings["timeout"]
+        self.retries = settings["retries"]
+        self.backoff = settings["backoff"]
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def get(self, url, params=None, headers=None) -> requests.Response:
+        """GET with jittered exponential backoff on connection errors, timeouts and 429/5xx."""
+        attempt = 0
+        while True:
+            try:
+                res = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+                if res.status_code not in RETRY_STATUSES or attempt >= self.retries:
+                    res.raise_for_status()
+                    return res
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.retries:
+                    raise
+            delay = self.backoff * (2 ** attempt) * random.uniform(0.5, 1.5)
+            time.sleep(delay)
+            attempt += 1
+
+    def get_json(self, url, params=None, headers=None):
+        return self.get(url, params=params, headers=headers).json()
+
+
+_clients = {}
+_breakers = {}
+_timings = {}
+_registry_lock = threading.Lock()
+
+
+def client(source: str) -> SourceClient:
+    if source not in _clients:
+        with _registry_lock:
+            if source not in _clients:
+                _clients[source] = SourceClient(source)
+    return _clients[source]
+
+
+def breaker(source: str) -> CircuitBreaker:
+    if source not in _breakers:
+        with _registry_lock:
+            if source not in _breakers:
+                settings = settings_for(source)
+                _breakers[source] = CircuitBreaker(settings["failure_threshold"], settings["reset_timeout"])
+    return _breakers[source]
+
+
+def gather(*calls):
+    """Run zero-arg callables concurrently and return their results in order."""
+    futures = [_executor.submit(call) for call in calls]
+    return [future.result() for future in futures]
+
+
+def run_source(source: str, refresh) -> bool:
+    """
+    Run one source's refresh behind its circuit breaker and record how it went.
+    Returns True on success. Failures are logged, never raised, so the cache
+    keeps its last good contents.
+    """
+    source_breaker = breaker(source)
+    timing = _timings.setdefault(source, {
+        "runs": 0, "failures": 0, "skipped": 0,
+        "last_duration_ms": None, "last_outcome": None, "last_error": None, "last_run": None,
+    })
+
+    if not source_breaker.allow():
+        timing["skipped"] += 1
+        timing["last_outcome"] = "skipped"
+        return False
+
+    start = time.perf_counter()
+    try:
+        refresh()
+    except Exception as e:
+        source_breaker.record_failure()
+        timing["failures"] += 1
+        timing["last_outcome"] = "error"
+        timing["last_error"] = str(e)
+        print(f"Error refreshing {source}: {e}")
+        return False
+    else:
+        source_breaker.record_success()
+        timing["last_outcome"] = "ok"
+        timing["last_error"] = None
+        return True
+    finally:
+        timing["runs"] += 1
+        timing["last_run"] = time.time()
+        timing["last_duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        ingest_job_seconds.observe(time.perf_counter() - start, source, timing["last_outcome"])
+
+
+def source_stats() -> dict:
+    return {
+        source: {**timing, "breaker": breaker(source).state}
+        for source, timing in _timings.items()
+    }
+
+
+def executor_stats() -> dict:
+    """Occupancy of the shared fetch pool used by gather()."""
+    threads = len(_executor._threads)
+    return {
+        "threads": threads,
+        "busy": threads - _executor._idle_semaphore._value,
+        "max": _executor._max_workers,
+        "queued": _executor._work_queue.qsize(),
+    }
@@ -1,44 +1,148 @@
 import datetime
+import threading
+from collections import deque
 from get_youtube import youtube_cache
 from get_bluesky import bluesky_cache
+from broadcast import EventLog, sse_event
+from config import FEED_STREAM_MAX_RATE, FEED_STREAM_HISTORY, SSE_HEARTBEAT_SECONDS
 from db import get_db
+from storage import avatar_url
+import notify
 
 FEED_PER_SOURCE = 10
 FEED_MAX_PAGES = 10
+FEED_MAX_COMMENTS = FEED_PER_SOURCE * FEED_MAX_PAGES
 
-comments_cache = {"items": [], "last_updated": None}
+# Re-read this far behind the high-water mark: created_at is set when a
+# transaction starts, so a slow insert can commit with an older timestamp.
+COMMENTS_OVERLAP = datetime.timedelta(seconds=30)
+
+# high_water: (created_at, id) of the newest comment seen, for incremental refreshes
+comments_cache = {"items": [], "last_updated": None, "high_water": None}
+
+# The latest FEED_MAX_COMMENTS comments, newest first
+_comments_ring = deque(maxlen=FEED_MAX_COMMENTS)
+_comments_lock = threading.Lock()
+
+
+def _comment_row(row):
+    return {
+        "id": str(row[0]),
+        "user_id": str(row[1]),
+        "text": row[2],
+        "timestamp": row[3].isoformat(),
+        "author": row[4],
+        "author_profile_picture": avatar_url(row[5]),
+        "target_id": row[6],
+        "platform": "f27",
+    }
 
 
 def refresh_comments_cache():
     """
-    Fetch up to 100 recent comments from DB and cache them.
-    Called on startup and every 5 minutes by the scheduler.
+    Merge comments newer than the last seen (created_at, id) into the ring of
+    the latest FEED_MAX_COMMENTS, or load them all on the first run.
+    Triggered by the comments_changed NOTIFY, with a 5-minute poll as fallback.
+    Returns the comments that were new to this cache.
+    """
+    with _comments_lock:
+        if not _comments_ring and comments_cache["items"]:
+            # Warm-started from a snapshot
+            _comments_ring.extend(comments_cache["items"])
+
+        high_water = comments_cache.get("high_water")
+        with get_db() as (conn, cur):
+            if high_water:
+                since = datetime.datetime.fromisoformat(high_water[0]) - COMMENTS_OVERLAP
+                cur.execute(
+                    """
+                    SELECT id, user_id, content, created_at, author_name,
+                           author_profile_picture, target_id
+                    FROM comments
+                    WHERE created_at > %s
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                    """,
+                    (since, FEED_MAX_COMMENTS),
+                )
+            else:
+                cur.execute(
+                    """
+                    SELECT id, user_id, content, created_at, author_name,
+                           author_profile_picture, target_id
+                    FROM comments
+                    ORDER BY created_at DESC, id DESC
+                    LIMIT %s
+                    """,
+                    (FEED_MAX_COMMENTS,),
+                )
+            rows = cur.fetchall()
+
+        known = {c["id"] for c in _comments_ring}
+        new_comments = [_comment_row(row) for row in rows if str(row[0]) not in known]
+        if new_comments:
+            merged = sorted(
+                list(_comments_ring) + new_comments,
+                key=lambda c: (c["timestamp"], c["id"]),
+                reverse=True,
+            )
+            _comments_ring.clear()
+            _comments_ring.extend(merged[:FEED_MAX_COMMENTS])
+            newest = _comments_ring[0]
+            comments_cache["high_water"] = [newest["timestamp"], newest["id"]]
+            comments_cache["items"] = list(_comments_ring)
+        if new_comments or comments_cache["last_updated"] is None:
+            # Only a real change counts as a refresh (see ingest.make_job), so
+            # no-op polls and NOTIFYs don't re-render pages or rewrite the snapshot
+            comments_cache["last_updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+        return new_comments
+
+
+class CommentsPusher(threading.Thread):
+    """
+    Runs `job` whenever a comments_changed notification arrives. Notifications
+    that land while a refresh is running collapse into one follow-up refresh.
     """
-    with get_db() as (conn, cur):
-        cur.execute(
-            """
-            SELECT id, user_id, content, created_at, author_name,
-                   author_profile_picture, target_id
-            FROM comments
-            ORDER BY created_at DESC
-            LIMIT %s
-            """,
-            (FEED_PER_SOURCE * FEED_MAX_PAGES,),
-        )
-        comments_cache["items"] = [
-            {
-                "id": row[0],
-                "user_id": row[1],
-                "text": row[2],
-                "timestamp": row[3].isoformat(),
-                "author": row[4],
-                "author_profile_picture": row[5],
-                "target_id": row[6],
-                "platform": "f27",
-            }
-            for row in cur.fetchall()
-        ]
-        comments_cache["last_updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+    def __init__(self, job):
+        super().__init__(name="comments-pusher", daemon=True)
+        self.job = job
+        self._wake = threading.Event()
+        self._stopped = False
+
+    def trigger(self, payload=None):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def run(self):
+        while True:
+            self._wake.wait()
+            if self._stopped:
+                return
+            self._wake.clear()
+            self.job()
+
+
+_pusher = None
+
+
+def start_comments_pusher(job):
+    global _pusher
+    if _pusher is None:
+        _pusher = CommentsPusher(job)
+        notify.on(notify.COMMENTS_CHANNEL, _pusher.trigger)
+        _pusher.start()
+    return _pusher
+
+
+def stop_comments_pusher():
+    global _pusher
+    if _pusher is not None:
+        _pusher.stop()
+        _pusher = None
 
 
 def build_feed_page(page: int):
@@ -62,3 +166,55 @@ def build_feed_page(page: int):
         "page": page,
         "max_pages": FEED_MAX_PAGES,
     }
+
+
+# ---------- LIVE UPDATES (/feed/stream) ----------
+
+FEED_SOURCES = {
+    "youtube": youtube_cache,
+    "bluesky": bluesky_cache,
+    "comments": comments_cache,
+}
+
+feed_events = EventLog(
+    max_rate=FEED_STREAM_MAX_RATE,
+    heartbeat=SSE_HEARTBEAT_SECONDS,
+    history=FEED_STREAM_HISTORY,
+)
+
+# source -> keys of the items already announced
+_announced = {}
+_announced_lock = threading.Lock()
+
+
+def _item_key(item):
+    return item.get("uri") or item.get("id") or (item.get("author"), item.get("timestamp"))
+
+
+def publish_feed_updates():
+    """
+    Announce feed items that appeared since the last call to /feed/stream
+    subscribers. Called after every cache refresh. A source's first
+    non-empty load (boot, warm start) only seeds what counts as already seen.
+    """
+    new_items = []
+    with _announced_lock:
+        for source, cache in FEED_SOURCES.items():
+            items = cache["items"]
+            keys = {_item_key(item) for item in items}
+            seen = _announced.get(source)
+            if seen:
+                new_items.extend(item for item in items if _item_key(item) not in seen)
+            _announced[source] = keys
+
+    if new_items:
+        new_items.sort(key=lambda item: item.get("published_at") or item.get("timestamp") or "", reverse=True)
+        feed_events.publish(new_items)
+
+
+def render_feed_event(batches, token):
+    if batches is None:
+        # Resume token unknown or too old: client should reload /feed?page=1
+        return sse_event({"token": token}, event="reset", event_id=token)
+    items = [item for batch in batches for item in batch]
+    return sse_event({"items": items, "token": token}, event="items", event_id=token)
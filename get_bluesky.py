@@ -1,52 +1,117 @@
+import os
 import datetime
-import requests
+from config import BLUESKY_HANDLES, BLUESKY_MAX_POSTS
+from engine import client, gather
 
-bluesky_cache = {"items": [], "last_updated": None}
+BLUESKY_API = os.getenv("BLUESKY_API_URL", "https://public.api.bsky.app/xrpc")
+POLL_PAGE_SIZE = 30       # posts per request once a handle is caught up
+BACKFILL_PAGE_SIZE = 100  # posts per request on a handle's first sync
+MAX_PAGES_PER_POLL = 5
 
+# items: posts from every followed handle, deduplicated by uri, newest first
+# high_water: handle -> indexedAt of the newest feed item already seen
+bluesky_cache = {"items": [], "last_updated": None, "high_water": {}}
 
-def fetch_all_bluesky():
+
+def _is_repost(item) -> bool:
+    reason = item.get("reason") or {}
+    return item.get("reasonType") == "repost" or reason.get("$type", "").endswith("#reasonRepost")
+
+
+def fetch_author_posts(handle: str, high_water: str = None):
     """
-    Fetch up to 100 posts from Bluesky, cache in memory.
-    Called on startup and hourly by the scheduler.
+    Fetch a handle's new original posts, newest first.
+    Replies are filtered by the API (posts_no_replies) and reposts here. Pages
+    are followed with `cursor` only until reaching the high-water mark, so a
+    poll of an unchanged account costs one small request.
+    Returns (posts, new_high_water).
     """
-    handles = [
-        "aidthompsin.bsky.social",
-    ]
+    limit = POLL_PAGE_SIZE if high_water else BACKFILL_PAGE_SIZE
+    pages = MAX_PAGES_PER_POLL if high_water else 1
+    params = {"actor": handle, "limit": limit, "filter": "posts_no_replies"}
 
-    all_posts = []
+    posts = []
+    newest = high_water
+    for _ in range(pages):
+        data = client("bluesky").get_json(f"{BLUESKY_API}/app.bsky.feed.getAuthorFeed", params=params)
+        feed = data.get("feed", [])
 
-    for handle in handles:
-        try:
-            url = f"https://public.api.bsky.app/xrpc/app.bsky.feed.getAuthorFeed?actor={handle}&limit=100"
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            data = response.json()
+        caught_up = False
+        for item in feed:
+            post = item.get("post", {})
+            seen_at = (item.get("reason") or {}).get("indexedAt") or post.get("indexedAt", "")
+            if high_water and seen_at and seen_at <= high_water:
+                caught_up = True
+                break
+            if seen_at and (newest is None or seen_at > newest):
+                newest = seen_at
+
+            record = post.get("record", {})
+            text = record.get("text")
+            if not text or _is_repost(item) or record.get("reply"):
+                continue
+
+            posts.append({
+                "uri": post.get("uri"),
+                "title": "bluesky",
+                "platform": "bluesky",
+                "author": post.get("author", {}).get("handle", handle),
+                "text": text,
+                "timestamp": record.get("createdAt", ""),
+            })
+
+        cursor = data.get("cursor")
+        if caught_up or not cursor or not feed:
+            break
+        params = {**params, "cursor": cursor}
 
-            for item in data.get("feed", []):
-                post = item.get("post", {})
-                record = post.get("record", {})
+    return posts, newest
 
-                text = record.get("text")
-                if not text:
-                    continue
 
-                if item.get("reasonType") == "repost":
-                    continue
+def _post_key(post):
+    return post.get("uri") or (post.get("author"), post.get("timestamp"))
 
-                if record.get("reply"):
-                    continue
 
-                all_posts.append({
-                    "title": "bluesky",
-                    "platform": "bluesky",
-                    "author": post.get("author", {}).get("handle", handle),
-                    "text": text,
-                    "timestamp": record.get("createdAt", ""),
-                })
+def fetch_all_bluesky():
+    """
+    Poll every handle in BLUESKY_HANDLES concurrently for posts newer than its
+    high-water mark and merge them into the bounded post store.
+    A handle that fails simply keeps its existing posts; if every handle
+    fails the error is raised and the cache is left untouched.
+    Called on startup and every BLUESKY_REFRESH_MINUTES by the scheduler.
+    """
+    high_water = dict(bluesky_cache.get("high_water") or {})
 
+    def fetch(handle):
+        try:
+            return fetch_author_posts(handle, high_water.get(handle)), None
         except Exception as e:
-            print(f"Error fetching Bluesky posts for {handle}: {e}")
+            return None, e
+
+    results = gather(*(lambda h=handle: fetch(h) for handle in BLUESKY_HANDLES))
+
+    errors = [error for _, error in results if error is not None]
+    if BLUESKY_HANDLES and len(errors) == len(BLUESKY_HANDLES):
+        raise errors[0]
+
+    store = {_post_key(p): p for p in bluesky_cache["items"]}
+    new_posts = 0
+    for handle, (result, error) in zip(BLUESKY_HANDLES, results):
+        if error is not None:
+            print(f"Error fetching Bluesky posts for {handle}: {error}")
+            continue
+        posts, newest = result
+        for post in posts:
+            if _post_key(post) not in store:
+                new_posts += 1
+            store[_post_key(post)] = post
+        if newest:
+            high_water[handle] = newest
+
+    items = sorted(store.values(), key=lambda p: p.get("timestamp") or "", reverse=True)
 
-    bluesky_cache["items"] = all_posts
+    bluesky_cache["items"] = items[:BLUESKY_MAX_POSTS]
+    bluesky_cache["high_water"] = high_water
     bluesky_cache["last_updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    print(f"Bluesky sync: {new_posts} new posts from {len(BLUESKY_HANDLES)} handles")
     return bluesky_cache
@@ -1,11 +1,88 @@
-from fastapi import HTTPException
+import os
+import datetime
 from feedparser import parse
+from engine import client
 
-def get_podcast():
-    feed = parse("https://pinecast.com/feed/aid-thompsin-other-disappointm")
-    if feed.bozo:
-        raise HTTPException(
-            status_code=502,
-            detail=f"RSS parse error: {feed.bozo_exception}"
-        )
-    return feed.entries
+PODCAST_FEED_URL = os.getenv("PODCAST_FEED_URL", "https://pinecast.com/feed/aid-thompsin-other-disappointm")
+PODCAST_PAGE_SIZE = 20
+
+# last_updated moves only when the episodes change (ingest.make_job treats that
+# as a refresh); checked_at records every successful poll, 304s included
+podcast_cache = {"items": [], "last_updated": None, "checked_at": None, "etag": None, "modified": None}
+
+
+def _entry_date(entry):
+    parsed = entry.get("published_parsed") or entry.get("updated_parsed")
+    if not parsed:
+        return entry.get("published", "")
+    return datetime.datetime(*parsed[:6], tzinfo=datetime.timezone.utc).isoformat()
+
+
+def _normalize_entry(entry, feed_image=None):
+    audio_url = None
+    for enclosure in entry.get("enclosures", []):
+        if enclosure.get("type", "").startswith("audio") or not audio_url:
+            audio_url = enclosure.get("href")
+
+    image = entry.get("image", {}).get("href") if isinstance(entry.get("image"), dict) else None
+
+    return {
+        "id": entry.get("id") or entry.get("link"),
+        "title": entry.get("title", ""),
+        "platform": "podcast",
+        "date": _entry_date(entry),
+        "audio_url": audio_url,
+        "image": image or feed_image,
+        "duration": entry.get("itunes_duration"),
+        "external_link": entry.get("link"),
+    }
+
+
+def fetch_podcast():
+    """
+    Fetch the Pinecast RSS feed and cache normalized episodes in memory.
+    Sends If-None-Match / If-Modified-Since so an unchanged feed costs a 304.
+    Raises on failure, leaving the last good episodes in place.
+    Called on startup and every 30 minutes by the scheduler.
+    """
+    headers = {}
+    if podcast_cache["etag"]:
+        headers["If-None-Match"] = podcast_cache["etag"]
+    if podcast_cache["modified"]:
+        headers["If-Modified-Since"] = podcast_cache["modified"]
+
+    res = client("podcast").get(PODCAST_FEED_URL, headers=headers)
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    if res.status_code == 304:
+        podcast_cache["checked_at"] = now
+        return podcast_cache
+
+    feed = parse(res.content)
+    if feed.bozo and not feed.entries:
+        raise ValueError(f"RSS parse error: {feed.bozo_exception}")
+
+    feed_image = feed.feed.get("image", {}).get("href")
+    items = [_normalize_entry(entry, feed_image) for entry in feed.entries]
+    items.sort(key=lambda ep: ep["date"] or "", reverse=True)
+
+    podcast_cache["items"] = items
+    podcast_cache["etag"] = res.headers.get("ETag")
+    podcast_cache["modified"] = res.headers.get("Last-Modified")
+    podcast_cache["checked_at"] = now
+    podcast_cache["last_updated"] = now
+    return podcast_cache
+
+
+def podcast_total_pages():
+    return -(-len(podcast_cache["items"]) // PODCAST_PAGE_SIZE)
+
+
+def build_podcast_page(page: int):
+    """Serve a page of episodes from memory."""
+    items = podcast_cache["items"]
+    start = (page - 1) * PODCAST_PAGE_SIZE
+    return {
+        "items": items[start:start + PODCAST_PAGE_SIZE],
+        "page": page,
+        "total_pages": podcast_total_pages(),
+    }
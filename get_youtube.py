@@ -1,49 +1,75 @@
 import os
 import datetime
-import requests
+import threading
+from engine import client, gather
 
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 AID_CHANNEL_ID = os.getenv("AID_CHANNEL_ID")
 AID_CLIPS_CHANNEL_ID = os.getenv("AID_CLIPS_CHANNEL_ID")
 
-youtube_cache = {"items": [], "last_updated": None}
+YOUTUBE_API = os.getenv("YOUTUBE_API_URL", "https://www.googleapis.com/youtube/v3")
 
+PAGE_SIZE = 50
+# Safety cap on how far back one refresh walks a playlist (50 videos per page).
+# Only the first sync of a channel gets anywhere near it.
+MAX_BACKFILL_PAGES = int(os.getenv("YOUTUBE_MAX_BACKFILL_PAGES", "40"))
 
-def get_uploads_playlist_id(channel_id: str) -> str:
-    """Get the uploads playlist ID for a given YouTube channel."""
-    url = (
-        f"https://www.googleapis.com/youtube/v3/channels"
-        f"?part=contentDetails"
-        f"&id={channel_id}"
-        f"&key={YOUTUBE_API_KEY}"
-    )
-    res = requests.get(url, timeout=10)
-    res.raise_for_status()
-    data = res.json()
-    return data["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+# Quota cost in units of each Data API call we make
+QUOTA_COST = {"channels": 1, "playlistItems": 1}
 
+# items: every known video, newest first (the deduplicated index, keyed by id)
+# playlists: channel id -> uploads playlist id, which never changes
+# quota_used: API units spent by the last refresh
+youtube_cache = {"items": [], "last_updated": None, "playlists": {}, "quota_used": 0}
+youtube_quota = {"total": 0, "refreshes": 0}
 
-def fetch_videos_from_playlist(playlist_id: str, max_results: int = 50):
-    """
-    Fetch the most recent videos from a YouTube playlist.
-    Returns a list of dicts containing video metadata.
-    """
-    url = (
-        f"https://www.googleapis.com/youtube/v3/playlistItems"
-        f"?part=snippet,contentDetails"
-        f"&maxResults={max_results}"
-        f"&playlistId={playlist_id}"
-        f"&key={YOUTUBE_API_KEY}"
+
+class _QuotaMeter:
+    """Counts API units spent during one refresh (calls may run concurrently)."""
+
+    def __init__(self):
+        self.units = 0
+        self._lock = threading.Lock()
+
+    def charge(self, endpoint: str):
+        with self._lock:
+            self.units += QUOTA_COST[endpoint]
+
+
+def get_uploads_playlist_id(channel_id: str, quota: _QuotaMeter = None) -> str:
+    """Get the uploads playlist ID for a given YouTube channel, memoized in the cache."""
+    playlists = youtube_cache.setdefault("playlists", {})
+    if channel_id in playlists:
+        return playlists[channel_id]
+
+    data = client("youtube").get_json(
+        f"{YOUTUBE_API}/channels",
+        params={"part": "contentDetails", "id": channel_id, "key": YOUTUBE_API_KEY},
     )
+    if quota:
+        quota.charge("channels")
+    playlist_id = data["items"][0]["contentDetails"]["relatedPlaylists"]["uploads"]
+    playlists[channel_id] = playlist_id
+    return playlist_id
 
-    try:
-        res = requests.get(url, timeout=10)
-        res.raise_for_status()
-    except requests.RequestException as e:
-        print(f"Error fetching playlist: {e}")
-        return []
 
-    data = res.json()
+def fetch_videos_from_playlist(playlist_id: str, max_results: int = 50, page_token: str = None,
+                               quota: _QuotaMeter = None):
+    """
+    Fetch one page of videos from a YouTube playlist, newest first.
+    Returns (videos, next_page_token); raises on HTTP errors.
+    """
+    params = {
+        "part": "snippet,contentDetails",
+        "maxResults": max_results,
+        "playlistId": playlist_id,
+        "key": YOUTUBE_API_KEY,
+    }
+    if page_token:
+        params["pageToken"] = page_token
+    data = client("youtube").get_json(f"{YOUTUBE_API}/playlistItems", params=params)
+    if quota:
+        quota.charge("playlistItems")
     items = data.get("items", [])
 
     videos = []
@@ -70,33 +96,77 @@ def fetch_videos_from_playlist(playlist_id: str, max_results: int = 50):
             "channel_id": snippet.get("channelId"),
         })
 
+    return videos, data.get("nextPageToken")
+
+
+def fetch_new_videos(playlist_id: str, known_ids, quota: _QuotaMeter = None):
+    """
+    Walk a playlist page by page until reaching a video we already have.
+    On the first sync of a channel this backfills up to MAX_BACKFILL_PAGES pages.
+    """
+    videos = []
+    page_token = None
+    for _ in range(MAX_BACKFILL_PAGES):
+        page, page_token = fetch_videos_from_playlist(playlist_id, 50, page_token, quota)
+        videos.extend(page)
+        if not page_token or any(v["id"] in known_ids for v in page):
+            break
     return videos
 
 
 def fetch_all_youtube():
     """
-    Fetch 50 videos from AID main channel + 50 from clips channel.
-    Combine, sort by date, and update the in-memory cache.
+    Incrementally sync the AID main and clips channels into the video index.
+    Only pages newer than the last known video are fetched; results are merged
+    by video id and kept sorted by published_at, newest first.
+    Both channels are synced concurrently. Raises on failure, leaving the cache untouched.
     Called on startup and every hour by the scheduler.
     """
-    try:
-        aid_playlist = get_uploads_playlist_id(AID_CHANNEL_ID)
-        clips_playlist = get_uploads_playlist_id(AID_CLIPS_CHANNEL_ID)
+    quota = _QuotaMeter()
+    index = {v["id"]: v for v in youtube_cache["items"]}
 
-        aid_videos = fetch_videos_from_playlist(aid_playlist, max_results=50)
-        clips_videos = fetch_videos_from_playlist(clips_playlist, max_results=50)
+    aid_playlist, clips_playlist = gather(
+        lambda: get_uploads_playlist_id(AID_CHANNEL_ID, quota),
+        lambda: get_uploads_playlist_id(AID_CLIPS_CHANNEL_ID, quota),
+    )
+    aid_videos, clips_videos = gather(
+        lambda: fetch_new_videos(aid_playlist, index, quota),
+        lambda: fetch_new_videos(clips_playlist, index, quota),
+    )
 
-        combined = aid_videos + clips_videos
-        combined.sort(key=lambda v: v.get("published_at", ""), reverse=True)
+    # Re-fetched known videos overwrite their entries, picking up title/description edits
+    for video in aid_videos + clips_videos:
+        index[video["id"]] = video
+    combined = sorted(index.values(), key=lambda v: v.get("published_at") or "", reverse=True)
 
-        youtube_cache["items"] = combined
-        youtube_cache["last_updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    except Exception as e:
-        print(f"Error fetching YouTube data: {e}")
+    youtube_quota["total"] += quota.units
+    youtube_quota["refreshes"] += 1
 
+    youtube_cache["items"] = combined
+    youtube_cache["quota_used"] = quota.units
+    youtube_cache["last_updated"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    print(f"YouTube sync: {len(aid_videos) + len(clips_videos)} fetched, "
+          f"{len(combined)} indexed, {quota.units} quota units")
     return youtube_cache
 
 
+def youtube_total_pages():
+    return -(-len(youtube_cache["items"]) // PAGE_SIZE)  # ceil division
+
+
+def build_youtube_page(page: int):
+    """Slice a /youtube page out of the cache."""
+    items = youtube_cache["items"]
+    start = (page - 1) * PAGE_SIZE
+    end = start + PAGE_SIZE
+    total_pages = youtube_total_pages()
+    return {
+        "items": items[start:end],
+        "page": page,
+        "total_pages": total_pages,
+    }
+
+
 def fetch_youtube_feed():
     """Return a handful of recent videos for the homepage feed."""
     if youtube_cache["items"]:
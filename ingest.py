@@ -0,0 +1,152 @@
+"""
+Cache ingestion jobs.
+
+Run standalone with `python -m ingest` (the Procfile `worker` process) to own
+every upstream refresh and publish the results to cache_snapshots, so any
+number of API workers share one set of YouTube/Bluesky/Pinecast calls.
+With INGEST_MODE=inline the API process runs the same jobs itself.
+
+The feed comments cache is always refreshed inside each API process: it is
+incremental, cheap, and pushed by the comments_changed NOTIFY.
+"""
+import datetime
+from apscheduler.schedulers.blocking import BlockingScheduler
+from config import SNAPSHOT_POLL_SECONDS, BLUESKY_REFRESH_MINUTES
+from get_youtube import fetch_all_youtube
+from get_bluesky import fetch_all_bluesky
+from get_pinecast import fetch_podcast
+from feed import refresh_comments_cache, start_comments_pusher
+from snapshots import SOURCES, publish, sync_snapshots, sync_newer_snapshots, save_local, load_local
+from engine import run_source
+
+# (source, refresh function, scheduler interval)
+JOBS = [
+    ("youtube", fetch_all_youtube, {"hours": 1}),
+    ("bluesky", fetch_all_bluesky, {"minutes": BLUESKY_REFRESH_MINUTES}),
+    ("podcast", fetch_podcast, {"minutes": 30}),
+]
+
+# Fallback poll only; new comments normally arrive via NOTIFY
+COMMENTS_POLL = {"minutes": 5}
+
+
+def make_job(source, refresh, publish_snapshot=False, on_refresh=None):
+    """
+    Wrap a refresh function so that, when it actually refreshed the cache, the
+    result is saved locally, optionally published, and the callback runs.
+    """
+    def run():
+        cache = SOURCES[source]
+        before = cache.get("last_updated")
+        if not run_source(source, refresh) or cache.get("last_updated") == before:
+            return  # refresh failed or was skipped; keep serving the last good copy
+        try:
+            save_local(source)
+        except OSError as e:
+            print(f"Error saving {source} snapshot: {e}")
+        if publish_snapshot:
+            try:
+                publish(source)
+            except Exception as e:
+                print(f"Error publishing {source} snapshot: {e}")
+        if on_refresh:
+            on_refresh()
+    run.__name__ = f"refresh_{source}"
+    return run
+
+
+def warm_start(on_refresh=None):
+    """Load the local snapshot files so the process can serve immediately."""
+    loaded = load_local()
+    if loaded:
+        print(f"Warm start from snapshots: {', '.join(loaded)}")
+    if on_refresh:
+        on_refresh()
+
+
+def run_and_schedule(scheduler, publish_snapshot=False, on_refresh=None):
+    """
+    Register every refresh job on the scheduler. Each also runs once as soon as
+    the scheduler starts, in the background, instead of blocking startup.
+    """
+    now = datetime.datetime.now(datetime.timezone.utc)
+    for source, refresh, interval in JOBS:
+        scheduler.add_job(
+            make_job(source, refresh, publish_snapshot, on_refresh),
+            "interval",
+            next_run_time=now,
+            **interval,
+        )
+
+
+def follow_comments(scheduler, on_refresh=None):
+    """Keep this process's feed comments current: push-driven, with a periodic poll."""
+    job = make_job("comments", refresh_comments_cache, on_refresh=on_refresh)
+    start_comments_pusher(job)
+    scheduler.add_job(
+        job,
+        "interval",
+        next_run_time=datetime.datetime.now(datetime.timezone.utc),
+        **COMMENTS_POLL,
+    )
+
+
+def follow_snapshots(scheduler, on_refresh=None):
+    """API-worker side of INGEST_MODE=external: load snapshots now and poll for new ones."""
+    def sync():
+        try:
+            changed = sync_snapshots()
+        except Exception as e:
+            print(f"Error loading cache snapshots: {e}")
+            return
+        for source in changed:
+            try:
+                save_local(source)
+            except OSError as e:
+                print(f"Error saving {source} snapshot: {e}")
+        if changed and on_refresh:
+            on_refresh()
+    sync.__name__ = "sync_snapshots"
+
+    scheduler.add_job(
+        sync,
+        "interval",
+        seconds=SNAPSHOT_POLL_SECONDS,
+        next_run_time=datetime.datetime.now(datetime.timezone.utc),
+    )
+
+
+def load_shared_state():
+    """
+    Ingest worker: after the local warm start, take any shared snapshot that is
+    newer. Local files don't survive a dyno restart, and starting from empty
+    would re-backfill upstream and publish over the complete shared copy.
+    """
+    try:
+        loaded = sync_newer_snapshots()
+    except Exception as e:
+        print(f"Error loading shared snapshots: {e}")
+        return
+    for source in loaded:
+        try:
+            save_local(source)
+        except OSError as e:
+            print(f"Error saving {source} snapshot: {e}")
+    if loaded:
+        print(f"Loaded shared snapshots: {', '.join(loaded)}")
+
+
+def main():
+    scheduler = BlockingScheduler()
+    warm_start()
+    load_shared_state()
+    run_and_schedule(scheduler, publish_snapshot=True)
+    print("Ingestion worker running.")
+    try:
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        pass
+
+
+if __name__ == "__main__":
+    main()
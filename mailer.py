@@ -0,0 +1,322 @@
+"""
+Durable outbound mail queue.
+
+Request handlers call `enqueue_email()`, which inserts a row into
+email_outbox and NOTIFYs email_queued in the same transaction, then return.
+A MailSender thread in each API process claims due rows with
+FOR UPDATE SKIP LOCKED (so several processes never send the same message),
+sends them over one long-lived authenticated SMTP connection, and marks them
+sent. Failures are retried with exponential backoff up to MAIL_MAX_ATTEMPTS.
+A message that can never be sent (it won't build, or the server rejects the
+address) is failed permanently on the first try: next_attempt_at = infinity.
+
+Bodies can hold live password-reset tokens, so they are blanked as soon as a
+row is sent or dead, and those rows are deleted after MAIL_RETENTION_DAYS.
+
+A claimed row gets a lease (next_attempt_at pushed into the future) before
+sending, so mail claimed by a process that dies mid-batch is picked up again
+after the lease expires rather than being lost or sent twice immediately.
+A connection-level failure (can't connect, timeout, disconnect) ends the
+batch at once: the rows not yet tried are released without using up an
+attempt, so a hanging server can't hold a batch past its lease.
+"""
+import smtplib
+import threading
+import time
+from collections import deque
+from email.message import EmailMessage
+
+import notify
+from config import (
+    SMTP_HOST, SMTP_PORT, SMTP_SSL, SMTP_USER, SMTP_PASSWORD, MAIL_FROM,
+    MAIL_BATCH_SIZE, MAIL_MAX_ATTEMPTS, MAIL_POLL_SECONDS, SMTP_IDLE_SECONDS, MAIL_RETENTION_DAYS,
+)
+from db import get_db
+
+MAIL_CHANNEL = "email_queued"
+SMTP_TIMEOUT_SECONDS = 30
+# Must outlast a whole batch of slow-but-working sends, or a second process
+# could claim rows this one is still sending
+LEASE_SECONDS = max(300, 2 * MAIL_BATCH_SIZE * SMTP_TIMEOUT_SECONDS)
+RETRY_BASE_SECONDS = 30
+RETRY_MAX_SECONDS = 3600
+PRUNE_INTERVAL_SECONDS = 3600
+
+# Retrying can't help these: the address itself is refused or can't be encoded
+PERMANENT_SMTP_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPNotSupportedError, UnicodeEncodeError)
+# Errors the server answered for one message; the connection is still good
+CONNECTION_ERRORS = (smtplib.SMTPConnectError, smtplib.SMTPHeloError, smtplib.SMTPAuthenticationError)
+
+
+def is_connection_error(e: Exception) -> bool:
+    """True unless the server gave a per-message reply (4xx/5xx) on a working connection."""
+    return not isinstance(e, smtplib.SMTPResponseException) or isinstance(e, CONNECTION_ERRORS)
+
+mail_stats = {
+    "sent": 0, "failed": 0, "gave_up": 0, "rejected": 0, "pruned": 0,
+    "connects": 0, "batches": 0, "errors": 0,
+}
+_latencies = deque(maxlen=500)  # seconds from enqueue to sent, most recent sends
+
+
+def enqueue_email(to_addr: str, subject: str, body: str, reply_to: str = None):
+    """Queue a plain-text message for the sender; returns once it's committed."""
+    with get_db() as (conn, cur):
+        cur.execute(
+            """
+            INSERT INTO email_outbox (to_addr, reply_to, subject, body)
+            VALUES (%s, %s, %s, %s)
+            """,
+            (to_addr, reply_to, subject, body),
+        )
+        notify.notify(cur, MAIL_CHANNEL, "")
+        conn.commit()
+
+
+def retry_delay(attempts: int) -> float:
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+def _build_message(row):
+    msg = EmailMessage()
+    msg["Subject"] = row["subject"]
+    msg["From"] = MAIL_FROM
+    msg["To"] = row["to_addr"]
+    if row["reply_to"]:
+        msg["Reply-To"] = row["reply_to"]
+    msg.set_content(row["body"])
+    return msg
+
+
+class MailSender(threading.Thread):
+    """Drains email_outbox when woken by email_queued, and every MAIL_POLL_SECONDS for retries."""
+
+    def __init__(self):
+        super().__init__(name="mail-sender", daemon=True)
+        self._wake = threading.Event()
+        self._stopped = False
+        self._smtp = None
+        self._last_used = 0.0
+        self._last_pruned = 0.0
+
+    def trigger(self, payload=None):
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    # ---------- SMTP connection ----------
+
+    def _connect(self):
+        cls = smtplib.SMTP_SSL if SMTP_SSL else smtplib.SMTP
+        smtp = cls(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT_SECONDS)
+        if SMTP_USER:
+            smtp.login(SMTP_USER, SMTP_PASSWORD)
+        mail_stats["connects"] += 1
+        return smtp
+
+    def _close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
+
+    def _send(self, msg):
+        if self._smtp is None:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            # The server dropped an idle connection; reconnect once
+            self._close()
+            self._smtp = self._connect()
+            self._smtp.send_message(msg)
+        self._last_used = time.monotonic()
+
+    # ---------- queue ----------
+
+    def _claim(self):
+        with get_db() as (conn, cur):
+            cur.execute(
+                """
+                UPDATE email_outbox
+                SET attempts = attempts + 1,
+                    next_attempt_at = now() + make_interval(secs => %s)
+                WHERE id IN (
+                    SELECT id FROM email_outbox
+                    WHERE sent_at IS NULL AND next_attempt_at <= now() AND attempts < %s
+                    ORDER BY next_attempt_at
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                RETURNING id, to_addr, reply_to, subject, body, attempts, created_at
+                """,
+                (LEASE_SECONDS, MAIL_MAX_ATTEMPTS, MAIL_BATCH_SIZE),
+            )
+            columns = [desc[0] for desc in cur.description]
+            rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+            conn.commit()
+        return rows
+
+    def _record(self, sent, failed, rejected, released=()):
+        with get_db() as (conn, cur):
+            if sent:
+                cur.execute(
+                    "UPDATE email_outbox SET sent_at = now(), last_error = NULL, body = '' WHERE id = ANY(%s) "
+                    "RETURNING extract(epoch FROM sent_at - created_at)",
+                    (sent,),
+                )
+                _latencies.extend(float(row[0]) for row in cur.fetchall())
+            for row_id, attempts, error in failed:
+                cur.execute(
+                    "UPDATE email_outbox SET next_attempt_at = now() + make_interval(secs => %s), "
+                    "last_error = %s, body = CASE WHEN attempts >= %s THEN '' ELSE body END WHERE id = %s",
+                    (retry_delay(attempts), error[:500], MAIL_MAX_ATTEMPTS, row_id),
+                )
+            for row_id, error in rejected:
+                cur.execute(
+                    "UPDATE email_outbox SET next_attempt_at = 'infinity', last_error = %s, body = '' "
+                    "WHERE id = %s",
+                    (error[:500], row_id),
+                )
+            if released:
+                # Claimed but never tried: hand back the attempt and retry after the base delay
+                cur.execute(
+                    "UPDATE email_outbox SET attempts = attempts - 1, "
+                    "next_attempt_at = now() + make_interval(secs => %s) WHERE id = ANY(%s)",
+                    (RETRY_BASE_SECONDS, list(released)),
+                )
+            conn.commit()
+
+    def _prune(self):
+        """Delete sent and dead rows older than MAIL_RETENTION_DAYS."""
+        with get_db() as (conn, cur):
+            cur.execute(
+                """
+                DELETE FROM email_outbox
+                WHERE created_at < now() - make_interval(secs => %s)
+                  AND (sent_at IS NOT NULL OR attempts >= %s OR next_attempt_at = 'infinity')
+                """,
+                (MAIL_RETENTION_DAYS * 86400, MAIL_MAX_ATTEMPTS),
+            )
+            mail_stats["pruned"] += cur.rowcount
+            conn.commit()
+        self._last_pruned = time.monotonic()
+
+    def drain(self):
+        """Send everything that's due, one batch at a time. Returns the number sent."""
+        total = 0
+        while not self._stopped:
+            rows = self._claim()
+            if not rows:
+                break
+            mail_stats["batches"] += 1
+            sent, failed, rejected, released = [], [], [], []
+            connection_lost = False
+            for row in rows:
+                if connection_lost:
+                    released.append(row["id"])
+                    continue
+                try:
+                    msg = _build_message(row)
+                except Exception as e:
+                    rejected.append((row["id"], f"Could not build message: {e}"))
+                    mail_stats["rejected"] += 1
+                    print(f"Dropping email {row['id']}: could not build message: {e}")
+                    continue
+                try:
+                    self._send(msg)
+                    sent.append(row["id"])
+                except PERMANENT_SMTP_ERRORS as e:
+                    rejected.append((row["id"], str(e)))
+                    mail_stats["rejected"] += 1
+                    print(f"Dropping email {row['id']}: rejected: {e}")
+                except Exception as e:
+                    failed.append((row["id"], row["attempts"], str(e)))
+                    mail_stats["failed"] += 1
+                    if row["attempts"] >= MAIL_MAX_ATTEMPTS:
+                        mail_stats["gave_up"] += 1
+                        print(f"Giving up on email {row['id']} after {row['attempts']} attempts: {e}")
+                    if is_connection_error(e):
+                        # Don't reconnect (and maybe wait out the timeout) once per remaining row
+                        self._close()
+                        connection_lost = True
+            self._record(sent, failed, rejected, released)
+            mail_stats["sent"] += len(sent)
+            total += len(sent)
+            if connection_lost or (failed and not sent):
+                break  # server is unhappy; leave the rest to their retry times
+        return total
+
+    def run(self):
+        while not self._stopped:
+            try:
+                self.drain()
+                if time.monotonic() - self._last_pruned > PRUNE_INTERVAL_SECONDS:
+                    self._prune()
+            except Exception as e:
+                mail_stats["errors"] += 1
+                print(f"Error draining email outbox: {e}")
+            if self._smtp is not None and time.monotonic() - self._last_used > SMTP_IDLE_SECONDS:
+                self._close()
+            timeout = MAIL_POLL_SECONDS if self._smtp is None else min(MAIL_POLL_SECONDS, SMTP_IDLE_SECONDS)
+            self._wake.wait(timeout)
+            self._wake.clear()
+        self._close()
+
+
+_sender = None
+
+
+def start_mail_sender():
+    """Start this process's sender. Call before notify.start_listener() so it LISTENs on email_queued."""
+    global _sender
+    assert LEASE_SECONDS > MAIL_BATCH_SIZE * SMTP_TIMEOUT_SECONDS, "mail lease shorter than a batch"
+    if _sender is None:
+        _sender = MailSender()
+        notify.on(MAIL_CHANNEL, _sender.trigger)
+        _sender.start()
+    return _sender
+
+
+def stop_mail_sender():
+    global _sender
+    if _sender is not None:
+        _sender.stop()
+        _sender = None
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct))], 3)
+
+
+def get_mail_stats():
+    """Sender counters plus current queue depth and enqueue-to-send latency."""
+    with get_db() as (conn, cur):
+        cur.execute(
+            """
+            SELECT count(*),
+                   count(*) FILTER (WHERE attempts >= %s OR next_attempt_at = 'infinity'),
+                   extract(epoch FROM now() - min(created_at))
+            FROM email_outbox WHERE sent_at IS NULL
+            """,
+            (MAIL_MAX_ATTEMPTS,),
+        )
+        depth, dead, oldest = cur.fetchone()
+    latencies = list(_latencies)
+    return {
+        **mail_stats,
+        "queued": depth - dead,
+        "dead": dead,
+        "oldest_queued_seconds": float(oldest) if oldest is not None else None,
+        "connected": bool(_sender and _sender._smtp is not None),
+        "latency_p50": _percentile(latencies, 0.50),
+        "latency_p95": _percentile(latencies, 0.95),
+        "latency_max": round(max(latencies), 3) if latencies else None,
+    }
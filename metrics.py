@@ -0,0 +1,228 @@
+"""
+Prometheus text-format metrics.
+
+Recording is lock-free: observe()/inc() append a tuple to a deque (atomic
+under the GIL) and return. The events are folded into bucket counts only
+when /metrics is scraped, or when a deque grows past MAX_PENDING between
+scrapes. Gauges (pool sizes, cache ages, threadpool use) are not recorded at
+all; collectors registered with `collector()` read them at scrape time.
+"""
+import re
+import threading
+import time
+from collections import deque
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+DB_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+JOB_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+MAX_PENDING = 50000
+
+_metrics = []
+_collectors = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _number(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name: str, help_text: str, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._events = deque()
+        self._series = {}  # label values -> aggregated state
+        self._fold_lock = threading.Lock()  # only taken by folding, never by recording
+        _metrics.append(self)
+
+    def _record(self, labels, value):
+        self._events.append((labels, value))
+        if len(self._events) > MAX_PENDING:
+            self._fold()
+
+    def _fold(self):
+        with self._fold_lock:
+            events = self._events
+            while events:
+                try:
+                    labels, value = events.popleft()
+                except IndexError:
+                    break
+                self._apply(labels, value)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        self._record(labels, amount)
+
+    def _apply(self, labels, value):
+        self._series[labels] = self._series.get(labels, 0) + value
+
+    def render(self):
+        self._fold()
+        for labels, value in sorted(self._series.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        self._record(labels, value)
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def _apply(self, labels, value):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        self._fold()
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', _number(float(bound)))])} {cumulative}"
+            yield f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', '+Inf')])} {count}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+def collector(fn):
+    """
+    Register fn() -> iterable of (name, kind, help, [(labels_dict, value)])
+    to be called on every scrape. Usable as a decorator.
+    """
+    _collectors.append(fn)
+    return fn
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.render())
+    for fn in _collectors:
+        try:
+            families = list(fn())
+        except Exception as e:
+            print(f"Error collecting metrics from {fn.__name__}: {e}")
+            continue
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                label_text = _labels(labels.keys(), labels.values())
+                lines.append(f"{name}{label_text} {_number(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# ---------- shared instruments ----------
+
+http_request_seconds = Histogram(
+    "http_request_duration_seconds", "Time from request start to response end.", ("method", "route", "status"),
+)
+db_query_seconds = Histogram(
+    "db_query_duration_seconds", "Time spent executing a query.", ("pool", "query"), buckets=DB_BUCKETS,
+)
+db_pool_wait_seconds = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting to check out a connection.", ("pool",), buckets=DB_BUCKETS,
+)
+ingest_job_seconds = Histogram(
+    "ingest_job_duration_seconds", "Duration of cache refresh jobs.", ("source", "outcome"), buckets=JOB_BUCKETS,
+)
+
+_QUERY_TARGET = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN)\s+(?:public\.)?([A-Za-z_][A-Za-z0-9_]*)", re.IGNORECASE)
+_query_labels = {}  # sql text -> "VERB table"
+
+
+def query_label(sql) -> str:
+    """Low-cardinality label for a statement, e.g. 'SELECT users'."""
+    if isinstance(sql, bytes):
+        sql = sql.decode("utf-8", "replace")
+    label = _query_labels.get(sql)
+    if label is None:
+        stripped = sql.lstrip()
+        verb = stripped.split(None, 1)[0].upper() if stripped else "?"
+        target = _QUERY_TARGET.search(sql)
+        label = f"{verb} {target.group(1).lower()}" if target else verb
+        if len(_query_labels) < 5000:
+            _query_labels[sql] = label
+    return label
+
+
+class MetricsMiddleware:
+    """Times every HTTP request, labelled by route template rather than raw path."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+        start = time.perf_counter()
+
+        async def timed_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            route = scope.get("route")
+            http_request_seconds.observe(
+                time.perf_counter() - start,
+                scope["method"],
+                route.path if route is not None else "unmatched",
+                str(status),
+            )
@@ -62,3 +62,9 @@ class ContentType(BaseModel):
     channel_title: Optional[str] = None  # youtube only
     channel_id: Optional[str] = None     # youtube only
     audio_url: Optional[str] = None      # pinecast/podcast only
+
+
+class ProfilingSettings(BaseModel):
+    sample_rate: float = 0.0          # fraction of matching requests to profile; 0 turns sampling off
+    path_prefix: str = "/"
+    duration_seconds: Optional[float] = 600  # sampling switches itself off after this; None = until changed
@@ -0,0 +1,118 @@
+"""
+Postgres LISTEN/NOTIFY fan-in for cross-process cache invalidation.
+
+Writers call `notify(cur, channel, payload)` inside their transaction; the
+notification is delivered to every listening process only once it commits.
+Each process runs one NotifyListener thread on a dedicated connection and
+dispatches to the handlers registered with `on()`.
+"""
+import select
+import threading
+import psycopg2
+import psycopg2.extensions
+from config import DATABASE_URL
+
+COMMENTS_CHANNEL = "comments_changed"
+USERS_CHANNEL = "users_changed"
+
+_handlers = {}  # channel -> [callback(payload)]
+
+
+def on(channel: str, callback):
+    """
+    Register callback(payload) for a channel. After a reconnect, notifications
+    may have been missed, so every callback is also called with payload=None,
+    meaning "assume anything changed".
+    """
+    _handlers.setdefault(channel, []).append(callback)
+
+
+def notify(cur, channel: str, payload: str):
+    cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+
+def _dispatch(channel, payload):
+    for callback in _handlers.get(channel, []):
+        try:
+            callback(payload)
+        except Exception as e:
+            print(f"Error handling {channel} notification: {e}")
+
+
+class NotifyListener(threading.Thread):
+    def __init__(self, dsn: str = DATABASE_URL, poll_timeout: float = 5.0):
+        super().__init__(name="pg-notify-listener", daemon=True)
+        self.dsn = dsn
+        self.poll_timeout = poll_timeout
+        self._stop_event = threading.Event()
+        self.connected = False
+        self.received = 0
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        backoff = 1.0
+        first = True
+        while not self._stop_event.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    for channel in _handlers:
+                        cur.execute(f'LISTEN "{channel}"')
+                self.connected = True
+                backoff = 1.0
+                if not first:
+                    for channel in _handlers:
+                        _dispatch(channel, None)
+                first = False
+
+                while not self._stop_event.is_set():
+                    if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        note = conn.notifies.pop(0)
+                        self.received += 1
+                        _dispatch(note.channel, note.payload)
+            except Exception as e:
+                self.connected = False
+                print(f"Notify listener error, reconnecting in {backoff:.0f}s: {e}")
+                first = False
+                self._stop_event.wait(backoff)
+                backoff = min(backoff * 2, 60.0)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+
+
+_listener = None
+
+
+def start_listener():
+    global _listener
+    if _listener is None and _handlers:
+        _listener = NotifyListener()
+        _listener.start()
+    return _listener
+
+
+def stop_listener():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def listener_stats():
+    return {
+        "running": _listener is not None,
+        "connected": bool(_listener and _listener.connected),
+        "received": _listener.received if _listener else 0,
+        "channels": list(_handlers),
+    }
@@ -0,0 +1,113 @@
+import hashlib
+import threading
+import orjson
+from fastapi import Request, Response
+from compression import available_encodings, compress, negotiate, COMPRESS_MIN_SIZE
+from feed import build_feed_page, FEED_MAX_PAGES
+from get_youtube import build_youtube_page, youtube_total_pages
+from get_pinecast import build_podcast_page, podcast_total_pages
+from snapshots import snapshot_ages
+
+# Polling clients must revalidate every time; unchanged pages cost an empty 304.
+PAGE_CACHE_CONTROL = "public, no-cache"
+
+# section -> (page builder, number of pages to pre-render)
+BUILDERS = {
+    "feed": (build_feed_page, lambda: FEED_MAX_PAGES),
+    "youtube": (build_youtube_page, youtube_total_pages),
+    "podcast": (build_podcast_page, podcast_total_pages),
+}
+
+# section -> caches it is built from, reported in the X-Snapshot-Age header.
+# Refresh times stay out of the bodies so a no-op refresh keeps the same ETag.
+SECTION_SOURCES = {
+    "feed": ("youtube", "bluesky", "comments"),
+    "youtube": ("youtube",),
+    "podcast": ("podcast",),
+}
+
+
+class RenderedPage:
+    """
+    A response body serialized once, plus its compressed variants.
+    Each representation gets its own strong ETag.
+    """
+    __slots__ = ("variants",)
+
+    def __init__(self, body: bytes):
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        self.variants = {None: (body, f'"{digest}"')}
+        if len(body) >= COMPRESS_MIN_SIZE:
+            for encoding in available_encodings():
+                self.variants[encoding] = (compress(body, encoding), f'"{digest}-{encoding}"')
+
+    def etags(self):
+        return [etag for _, etag in self.variants.values()]
+
+
+def render(payload) -> RenderedPage:
+    return RenderedPage(orjson.dumps(payload))
+
+
+# section -> {page: RenderedPage}. Replaced wholesale by render_pages() so a
+# request always sees one consistent generation.
+_rendered = {section: {} for section in BUILDERS}
+_render_lock = threading.Lock()
+
+
+def render_pages(sections=None):
+    """
+    Pre-render every /feed, /youtube and /podcast page from the current caches,
+    or only the given sections. Called after each cache refresh.
+    """
+    global _rendered
+    with _render_lock:  # refresh jobs can finish concurrently; newest data must win
+        _rendered = {
+            **_rendered,
+            **{
+                section: {page: render(build(page)) for page in range(1, max(1, page_count()) + 1)}
+                for section, (build, page_count) in BUILDERS.items()
+                if sections is None or section in sections
+            },
+        }
+
+
+def _etag_matches(if_none_match: str, etags) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return any(tag.removeprefix("W/") in etags for tag in candidates)
+
+
+def serve_page(request: Request, section: str, page: int) -> Response:
+    """
+    Serve a pre-rendered page in the best encoding the client accepts,
+    answering 304 when the client already has it.
+    """
+    rendered = _rendered[section].get(page)
+    if rendered is None:
+        # Not rendered yet, or past the last pre-rendered page
+        build, _ = BUILDERS[section]
+        rendered = render(build(page))
+
+    encoding = negotiate(request.headers.get("accept-encoding"))
+    if encoding not in rendered.variants:
+        encoding = None
+    body, etag = rendered.variants[encoding]
+
+    ages = snapshot_ages(SECTION_SOURCES[section])
+    headers = {
+        "ETag": etag,
+        "Cache-Control": PAGE_CACHE_CONTROL,
+        "Vary": "Accept-Encoding",
+        "X-Snapshot-Age": ", ".join(
+            f"{source}={'unknown' if age is None else age}" for source, age in ages.items()
+        ),
+    }
+    if _etag_matches(request.headers.get("if-none-match"), rendered.etags()):
+        return Response(status_code=304, headers=headers)
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
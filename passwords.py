@@ -0,0 +1,115 @@
+"""
+bcrypt hashing and verification on a dedicated process pool.
+
+bcrypt is CPU-bound for tens to hundreds of milliseconds per call, so it runs
+on PASSWORD_WORKERS processes (all cores by default) instead of the request
+threadpool or the event loop. At most PASSWORD_QUEUE_LIMIT operations may be
+running or queued per API process; beyond that callers get PasswordPoolBusy
+straight away, which the app turns into a 503 with Retry-After.
+
+If a worker process dies (OOM kill, segfault) the pool is broken for good,
+so it is replaced and the operation retried once on the new pool.
+"""
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+from config import BCRYPT_ROUNDS, PASSWORD_WORKERS, PASSWORD_QUEUE_LIMIT
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the hashing pool already has PASSWORD_QUEUE_LIMIT operations outstanding."""
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check(password: str, stored_hash: str) -> bool:
+    return bcrypt.checkpw(password.encode("utf-8"), stored_hash.encode("utf-8"))
+
+
+def hash_rounds(stored_hash: str):
+    """Cost factor of a $2b$NN$... hash, or None if it can't be read."""
+    parts = stored_hash.split("$")
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return None
+
+
+_pool = None
+_outstanding = 0
+password_stats = {"hashes": 0, "checks": 0, "rejected": 0, "rehashed": 0, "pool_restarts": 0}
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        # spawn: never fork a process that's already running threads
+        _pool = ProcessPoolExecutor(
+            max_workers=PASSWORD_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def _discard_pool(pool):
+    """Drop a broken pool so the next call starts a fresh one."""
+    global _pool
+    if _pool is pool:
+        _pool = None
+        password_stats["pool_restarts"] += 1
+        print("Password pool broken (worker died); starting a new one.")
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+async def _submit(fn, *args):
+    global _outstanding
+    if _outstanding >= PASSWORD_QUEUE_LIMIT:
+        password_stats["rejected"] += 1
+        raise PasswordPoolBusy()
+    _outstanding += 1
+    try:
+        for _ in range(2):
+            pool = _get_pool()
+            try:
+                return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+            except BrokenProcessPool:
+                _discard_pool(pool)
+        # Broke twice in a row; let the client retry rather than 500
+        raise PasswordPoolBusy()
+    finally:
+        _outstanding -= 1
+
+
+async def hash_password(password: str) -> str:
+    password_stats["hashes"] += 1
+    return await _submit(_hash, password, BCRYPT_ROUNDS)
+
+
+async def verify_password(password: str, stored_hash: str) -> bool:
+    password_stats["checks"] += 1
+    return await _submit(_check, password, stored_hash)
+
+
+def needs_rehash(stored_hash: str) -> bool:
+    return hash_rounds(stored_hash) != BCRYPT_ROUNDS
+
+
+def shutdown_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def get_password_stats():
+    return {
+        **password_stats,
+        "outstanding": _outstanding,
+        "queue_limit": PASSWORD_QUEUE_LIMIT,
+        "workers": PASSWORD_WORKERS,
+        "rounds": BCRYPT_ROUNDS,
+    }
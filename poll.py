@@ -0,0 +1,223 @@
+"""
+Active poll cache with write-behind vote counters.
+
+A vote is a single INSERT into poll_votes (the unique (poll_id, user_id)
+constraint still prevents double voting). The yes/no counters on the polls
+row are not touched per vote: each process adds the vote to its in-memory
+pending deltas, and a flusher applies them in one UPDATE every
+POLL_FLUSH_INTERVAL seconds, so voters never queue on the polls row lock.
+
+Tallies served to clients are the polls row as last read (at most
+POLL_CACHE_TTL old) plus this process's unflushed votes. Votes cast on other
+workers show up once they flush and this cache re-reads the row.
+
+Tally changes are pushed to /poll/stream subscribers through poll_broadcaster.
+"""
+import time
+import asyncio
+from fastapi import HTTPException
+from broadcast import Broadcaster, sse_event
+from cache import TTLCache
+from config import POLL_CACHE_TTL, POLL_FLUSH_INTERVAL, POLL_STREAM_MAX_RATE, SSE_HEARTBEAT_SECONDS
+from db import get_async_db
+
+# Last read of the active poll: {"id", "question", "yes", "no", "loaded_at"}
+_active = None
+# poll_id -> {"yes": n, "no": n} not yet written to the polls row
+_pending = {}
+_lock = asyncio.Lock()
+
+# (poll_id, user_id) -> "yes" / "no", or "" (not voted) for only POLL_CACHE_TTL,
+# since the vote may be cast through another worker
+_user_votes = TTLCache(maxsize=50000, ttl=300)
+
+poll_broadcaster = Broadcaster(max_rate=POLL_STREAM_MAX_RATE, heartbeat=SSE_HEARTBEAT_SECONDS)
+
+poll_stats = {"votes": 0, "duplicates": 0, "flushes": 0, "flushed_votes": 0, "flush_errors": 0, "reloads": 0}
+
+
+def poll_response(poll_id, question, yes_votes, no_votes, user_vote):
+    total = yes_votes + no_votes
+    return {
+        "poll_id": str(poll_id),
+        "question": question,
+        "yes_votes": yes_votes,
+        "no_votes": no_votes,
+        "total": total,
+        "yes_percent": round(yes_votes / total * 100) if total > 0 else 0,
+        "no_percent": round(no_votes / total * 100) if total > 0 else 0,
+        "user_vote": user_vote,
+    }
+
+
+async def _reload():
+    global _active
+    async with get_async_db() as conn:
+        row = await conn.fetchrow(
+            "SELECT id, question, yes_votes, no_votes FROM polls ORDER BY created_at DESC LIMIT 1"
+        )
+    poll_stats["reloads"] += 1
+    if not row:
+        _active = None
+        return
+    _active = {
+        "id": row["id"],
+        "question": row["question"],
+        "yes": row["yes_votes"],
+        "no": row["no_votes"],
+        "loaded_at": time.monotonic(),
+    }
+
+
+async def get_active_poll():
+    """The active poll with current tallies, or None. Re-reads the DB at most every POLL_CACHE_TTL."""
+    if _active is None or time.monotonic() - _active["loaded_at"] > POLL_CACHE_TTL:
+        async with _lock:  # one reload at a time; waiters reuse its result
+            if _active is None or time.monotonic() - _active["loaded_at"] > POLL_CACHE_TTL:
+                await _reload()
+    if _active is None:
+        return None
+    pending = _pending.get(_active["id"], {})
+    return {
+        "id": _active["id"],
+        "question": _active["question"],
+        "yes": _active["yes"] + pending.get("yes", 0),
+        "no": _active["no"] + pending.get("no", 0),
+    }
+
+
+async def get_user_vote(poll_id, user_id):
+    key = (str(poll_id), str(user_id))
+    vote = _user_votes.get(key)
+    if vote is None:
+        async with get_async_db() as conn:
+            vote = await conn.fetchval(
+                "SELECT vote FROM poll_votes WHERE poll_id = $1 AND user_id = $2",
+                poll_id, str(user_id),
+            ) or ""
+        _user_votes.set(key, vote, ttl=None if vote else POLL_CACHE_TTL)
+    return vote or None
+
+
+async def cast_vote(user_id, vote: str):
+    """Record a vote in one round trip and return the updated poll."""
+    poll = await get_active_poll()
+    if poll is None:
+        raise HTTPException(status_code=404, detail="No active poll.")
+
+    async with get_async_db() as conn:
+        inserted = await conn.fetchval(
+            """
+            INSERT INTO poll_votes (poll_id, user_id, vote)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (poll_id, user_id) DO NOTHING
+            RETURNING 1
+            """,
+            poll["id"], str(user_id), vote,
+        )
+    if not inserted:
+        poll_stats["duplicates"] += 1
+        raise HTTPException(status_code=409, detail="You have already voted in this poll.")
+
+    poll_stats["votes"] += 1
+    pending = _pending.setdefault(poll["id"], {"yes": 0, "no": 0})
+    pending[vote] += 1
+    poll[vote] += 1
+    _user_votes.set((str(poll["id"]), str(user_id)), vote)
+    broadcast_poll(poll)
+    return poll
+
+
+async def flush_counts():
+    """Apply every pending vote delta to the polls rows, one UPDATE per poll."""
+    if not _pending:
+        return
+    async with _lock:
+        # Snapshot the deltas; they stay pending (and counted in served tallies) until the commit
+        batch = {
+            poll_id: dict(counts) for poll_id, counts in _pending.items() if counts["yes"] or counts["no"]
+        }
+        if not batch:
+            return
+        try:
+            async with get_async_db() as conn:
+                async with conn.transaction():
+                    for poll_id, counts in batch.items():
+                        await conn.execute(
+                            "UPDATE polls SET yes_votes = yes_votes + $1, no_votes = no_votes + $2 WHERE id = $3",
+                            counts["yes"], counts["no"], poll_id,
+                        )
+        except Exception as e:
+            # The deltas are still pending, so the next flush retries them
+            poll_stats["flush_errors"] += 1
+            print(f"Error flushing poll counts: {e}")
+            return
+
+        # Move the flushed votes from pending into the cached row in one step,
+        # so served tallies never drop (votes cast during the UPDATE stay pending)
+        for poll_id, counts in batch.items():
+            pending = _pending[poll_id]
+            pending["yes"] -= counts["yes"]
+            pending["no"] -= counts["no"]
+            if not pending["yes"] and not pending["no"]:
+                del _pending[poll_id]
+        if _active is not None and _active["id"] in batch:
+            _active["yes"] += batch[_active["id"]]["yes"]
+            _active["no"] += batch[_active["id"]]["no"]
+        poll_stats["flushes"] += 1
+        poll_stats["flushed_votes"] += sum(c["yes"] + c["no"] for c in batch.values())
+
+
+# ---------- LIVE RESULTS ----------
+
+def broadcast_poll(poll):
+    # Shared stream, so no per-user vote in the payload
+    payload = poll_response(poll["id"], poll["question"], poll["yes"], poll["no"], None)
+    if payload != poll_broadcaster.value:
+        poll_broadcaster.publish(payload)
+
+
+def render_poll_event(payload, version):
+    return sse_event(payload, event="poll", event_id=version)
+
+
+async def watch_poll():
+    """
+    Background task: while anyone is subscribed, pick up tallies changed by
+    other workers (each cache reload) and broadcast them.
+    """
+    last = None
+    while True:
+        await asyncio.sleep(POLL_CACHE_TTL)
+        if not poll_broadcaster.subscribers:
+            last = None
+            continue
+        try:
+            poll = await get_active_poll()
+        except Exception as e:
+            print(f"Error refreshing poll for stream: {e}")
+            continue
+        current = poll and (poll["id"], poll["yes"], poll["no"])
+        if poll and current != last:
+            broadcast_poll(poll)
+        last = current
+
+
+async def run_flusher():
+    """Background task: flush counters every POLL_FLUSH_INTERVAL; flush once more on cancel."""
+    try:
+        while True:
+            await asyncio.sleep(POLL_FLUSH_INTERVAL)
+            await flush_counts()
+    except asyncio.CancelledError:
+        await flush_counts()
+        raise
+
+
+def get_poll_stats():
+    return {
+        **poll_stats,
+        "pending": sum(c["yes"] + c["no"] for c in _pending.values()),
+        "user_vote_cache": _user_votes.stats(),
+        "stream": poll_broadcaster.stats(),
+    }
@@ -0,0 +1,351 @@
+"""
+On-demand request profiling.
+
+A request is profiled when a superuser sends `X-Profile: 1`, or when it is
+picked by the sampling toggle (POST /admin/profiling). While at least one
+profiled request is running, a sampler thread snapshots stacks every
+PROFILE_INTERVAL_MS:
+
+- the event loop thread, whenever the request's own task is the one running
+  (otherwise the sample is counted as "(suspended)": awaiting I/O or a worker),
+- any threadpool thread currently running the request's sync handler or a
+  sync dependency (ProfiledRoute and @profiled_worker register the thread
+  on entry and drop it on exit).
+
+Every statement run through get_db or get_async_db while the request's
+context is active is also recorded with its duration and row count.
+Finished profiles are kept in memory (the last PROFILE_KEEP) and served as
+JSON or as folded stacks for flamegraph.pl / speedscope.
+
+Sampling never picks the SSE endpoints, and a profile still running after
+PROFILE_MAX_SECONDS is cut off (marked truncated) and stored as it is.
+
+When profiling is off the cost is one ContextVar lookup per DB statement and
+a scan of the request headers for X-Profile.
+"""
+import asyncio
+import contextvars
+import functools
+import inspect
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+
+from fastapi.routing import APIRoute
+
+from config import PROFILE_INTERVAL_MS, PROFILE_KEEP, PROFILE_MAX_QUERIES, PROFILE_MAX_SECONDS
+
+MAX_DEPTH = 128
+SUSPENDED = "(suspended)"
+# Long-lived streams (same suffix as ratelimit.UNCOUNTED_SUFFIXES) are never sampled
+UNSAMPLED_SUFFIXES = ("/stream",)
+
+current_profile = contextvars.ContextVar("current_profile", default=None)
+
+profiling_settings = {"sample_rate": 0.0, "path_prefix": "/", "until": None}
+
+_active = set()
+_active_lock = threading.Lock()
+_finished = deque(maxlen=PROFILE_KEEP)
+_wake = threading.Event()
+_sampler = None
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    module = code.co_filename.rsplit("/", 1)[-1].removesuffix(".py")
+    return f"{module}:{code.co_name}"
+
+
+def fold(frame) -> str:
+    """Root-first 'module:function;module:function' for a frame's stack."""
+    names = []
+    while frame is not None and len(names) < MAX_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class Profile:
+    def __init__(self, method: str, path: str, reason: str):
+        self.id = uuid.uuid4().hex[:16]
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.status = None
+        self.started_at = time.time()
+        self.duration_ms = None
+        self.loop = asyncio.get_running_loop()
+        self.task = asyncio.current_task()
+        self.loop_thread = threading.get_ident()
+        self.threads = set()
+        self.stacks = {}   # folded stack -> sample count
+        self.samples = 0
+        self.queries = []  # (statement, seconds, rows)
+        self.dropped_queries = 0
+        self.truncated = False
+        self._start = time.perf_counter()
+
+    def add_thread(self, ident: int):
+        self.threads.add(ident)
+
+    def remove_thread(self, ident: int):
+        self.threads.discard(ident)
+
+    def add_query(self, statement, seconds: float, rows):
+        if len(self.queries) >= PROFILE_MAX_QUERIES:
+            self.dropped_queries += 1
+            return
+        if isinstance(statement, bytes):
+            statement = statement.decode("utf-8", "replace")
+        self.queries.append((" ".join(statement.split()), seconds, rows))
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def _count(self, stack: str):
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+    def sample(self, frames):
+        self.samples += 1
+        loop_frame = frames.get(self.loop_thread)
+        if loop_frame is not None and asyncio.current_task(self.loop) is self.task:
+            self._count("event-loop;" + fold(loop_frame))
+        elif not self.threads:
+            self._count(SUSPENDED)
+        for ident in list(self.threads):
+            frame = frames.get(ident)
+            if frame is not None:
+                self._count("worker;" + fold(frame))
+
+    def finish(self, status):
+        self.status = status
+        self.duration_ms = round(self.elapsed() * 1000, 2)
+        # Drop references that would keep the loop and task alive
+        self.loop = self.task = None
+
+    def query_breakdown(self):
+        """Statements grouped by text, slowest total first."""
+        groups = {}
+        for statement, seconds, rows in self.queries:
+            group = groups.setdefault(statement, {"statement": statement, "calls": 0, "total_ms": 0.0, "rows": 0})
+            group["calls"] += 1
+            group["total_ms"] += seconds * 1000
+            group["rows"] += rows if rows and rows > 0 else 0
+        ordered = sorted(groups.values(), key=lambda g: g["total_ms"], reverse=True)
+        for group in ordered:
+            group["total_ms"] = round(group["total_ms"], 3)
+        return ordered
+
+    def summary(self):
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "status": self.status,
+            "started_at": self.started_at,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "truncated": self.truncated,
+            "queries": len(self.queries) + self.dropped_queries,
+            "query_ms": round(sum(seconds for _, seconds, _ in self.queries) * 1000, 3),
+        }
+
+    def to_dict(self):
+        return {
+            **self.summary(),
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "query_breakdown": self.query_breakdown(),
+            "query_log": [
+                {"statement": statement, "ms": round(seconds * 1000, 3), "rows": rows}
+                for statement, seconds, rows in self.queries
+            ],
+            "dropped_queries": self.dropped_queries,
+        }
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+
+class Sampler(threading.Thread):
+    """Samples every active profile; sleeps on an event while there are none."""
+
+    def __init__(self, interval: float):
+        super().__init__(name="profile-sampler", daemon=True)
+        self.interval = interval
+
+    def run(self):
+        while True:
+            with _active_lock:
+                profiles = list(_active)
+            if not profiles:
+                _wake.wait()
+                _wake.clear()
+                continue
+            frames = sys._current_frames()
+            for profile in profiles:
+                try:
+                    profile.sample(frames)
+                except Exception as e:
+                    print(f"Error sampling profile {profile.id}: {e}")
+                if profile.elapsed() > PROFILE_MAX_SECONDS:
+                    _truncate(profile)
+            del frames
+            time.sleep(self.interval)
+
+
+def profiled_worker(fn):
+    """
+    Wraps a sync function FastAPI runs in the threadpool (a handler or a
+    dependency) so the thread running it is sampled for the current profile.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profile = current_profile.get()
+        if profile is None:
+            return fn(*args, **kwargs)
+        ident = threading.get_ident()
+        profile.add_thread(ident)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.remove_thread(ident)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """Route class that registers the worker thread of sync handlers with profiled_worker."""
+
+    def __init__(self, path, endpoint, **kwargs):
+        if inspect.isfunction(endpoint) and not asyncio.iscoroutinefunction(endpoint):
+            endpoint = profiled_worker(endpoint)
+        super().__init__(path, endpoint, **kwargs)
+
+
+def _begin(profile):
+    global _sampler
+    with _active_lock:
+        _active.add(profile)
+        if _sampler is None:
+            _sampler = Sampler(PROFILE_INTERVAL_MS / 1000)
+            _sampler.start()
+    _wake.set()
+
+
+def _store(profile, status):
+    with _active_lock:
+        if profile not in _active:
+            return False
+        _active.remove(profile)
+    profile.finish(status)
+    _finished.append(profile)
+    return True
+
+
+def _truncate(profile):
+    """Stops sampling a profile that outlived PROFILE_MAX_SECONDS and stores what it has."""
+    profile.truncated = True
+    _store(profile, None)
+
+
+def _end(profile, status):
+    if not _store(profile, status):
+        # Already truncated by the sampler; just record how the request ended
+        profile.status = status
+
+
+def _sampled(path: str) -> bool:
+    rate = profiling_settings["sample_rate"]
+    if not rate:
+        return False
+    until = profiling_settings["until"]
+    if until is not None and time.time() > until:
+        profiling_settings.update(sample_rate=0.0, until=None)
+        return False
+    if path.endswith(UNSAMPLED_SUFFIXES):
+        return False
+    return path.startswith(profiling_settings["path_prefix"]) and random.random() < rate
+
+
+def configure(sample_rate: float, path_prefix: str = "/", duration_seconds: float = None):
+    profiling_settings.update(
+        sample_rate=max(0.0, min(1.0, sample_rate)),
+        path_prefix=path_prefix or "/",
+        until=time.time() + duration_seconds if sample_rate and duration_seconds else None,
+    )
+    return get_profiling_state()
+
+
+def get_profiling_state():
+    return {
+        **profiling_settings,
+        "active": len(_active),
+        "stored": len(_finished),
+        "interval_ms": PROFILE_INTERVAL_MS,
+    }
+
+
+def list_profiles():
+    return [profile.summary() for profile in reversed(_finished)]
+
+
+def get_profile(profile_id: str):
+    for profile in _finished:
+        if profile.id == profile_id:
+            return profile
+    return None
+
+
+class ProfilingMiddleware:
+    """
+    Profiles requests picked by sampling, or carrying X-Profile with a token
+    for which `authorize(token)` is true (app.py passes util.is_superuser_token).
+    Profiled responses carry X-Profile-Id.
+    """
+
+    def __init__(self, app, authorize):
+        self.app = app
+        self.authorize = authorize
+
+    def _requested(self, scope) -> bool:
+        wanted = False
+        token = None
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                wanted = value not in (b"", b"0")
+            elif name == b"authorization" and value.startswith(b"Bearer "):
+                token = value[7:].decode("latin-1")
+        return wanted and token is not None and self.authorize(token)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        if _sampled(scope["path"]):
+            reason = "sampled"
+        elif self._requested(scope):
+            reason = "header"
+        else:
+            return await self.app(scope, receive, send)
+
+        profile = Profile(scope["method"], scope["path"], reason)
+        status = None
+
+        async def profiled_send(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", profile.id.encode())]
+            await send(message)
+
+        token = current_profile.set(profile)
+        _begin(profile)
+        try:
+            await self.app(scope, receive, profiled_send)
+        finally:
+            _end(profile, status)
+            current_profile.reset(token)
@@ -0,0 +1,8 @@
+-- Shared token buckets for RATE_LIMIT_BACKEND=postgres (see ratelimit.py)
+-- Run this against your PostgreSQL database
+
+CREATE UNLOGGED TABLE public.rate_limits (
+    key text NOT NULL PRIMARY KEY,
+    tokens double precision NOT NULL,
+    updated_at timestamptz DEFAULT now() NOT NULL
+);
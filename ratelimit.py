@@ -0,0 +1,227 @@
+"""
+Per-client rate limiting and load shedding, as ASGI middleware.
+
+Each route in ROUTE_LIMITS gets token buckets keyed by client IP or by the
+authenticated user (falling back to IP for anonymous requests); every other
+route shares the DEFAULT_LIMIT bucket per IP. A request that finds its
+bucket empty gets a 429 with Retry-After before the handler runs.
+
+Buckets live in process memory, or with RATE_LIMIT_BACKEND=postgres in the
+rate_limits table so every worker enforces the same budget (route buckets
+only; the default bucket stays local to keep the DB off the hot path). If
+the table can't be reached, limiting falls back to memory rather than
+failing requests.
+
+Independently, each process admits at most MAX_IN_FLIGHT concurrent requests,
+and stops admitting the expensive routes at SHED_EXPENSIVE_AT of that, so an
+overloaded worker turns away bcrypt/SMTP/upload work first with a cheap 503.
+"""
+import time
+
+import orjson
+
+from cache import TTLCache
+from config import RATE_LIMIT_ENABLED, RATE_LIMIT_BACKEND, FORWARDED_HOPS, MAX_IN_FLIGHT
+from db import get_async_db
+from util import user_id_from_token
+
+
+class Limit:
+    """`capacity` requests in a burst, refilled evenly over `per_seconds`, per IP or per user."""
+
+    def __init__(self, name: str, capacity: int, per_seconds: float, by: str = "ip"):
+        self.name = name
+        self.capacity = capacity
+        self.rate = capacity / per_seconds  # tokens per second
+        self.by = by
+
+
+# (method, path) -> buckets the request must take a token from
+ROUTE_LIMITS = {
+    ("POST", "/login"): [Limit("login", 10, 60), Limit("login-hour", 60, 3600)],
+    ("POST", "/signup"): [Limit("signup", 5, 600)],
+    ("POST", "/forgot-password"): [Limit("forgot-password", 5, 900)],
+    ("POST", "/reset-password"): [Limit("reset-password", 10, 900)],
+    ("POST", "/contact"): [Limit("contact", 5, 3600)],
+    ("POST", "/comments"): [Limit("comments", 20, 60, by="user")],
+    ("POST", "/upload-profile-picture"): [Limit("upload", 10, 3600, by="user")],
+    ("POST", "/poll/vote"): [Limit("poll-vote", 10, 60, by="user")],
+}
+EXPENSIVE_ROUTES = {
+    ("POST", "/login"), ("POST", "/signup"), ("POST", "/reset-password"),
+    ("POST", "/forgot-password"), ("POST", "/contact"), ("POST", "/upload-profile-picture"),
+}
+DEFAULT_LIMIT = Limit("default", 300, 60)
+SHED_EXPENSIVE_AT = 0.75
+# Long-lived SSE connections would otherwise hold in-flight slots forever
+UNCOUNTED_SUFFIXES = ("/stream",)
+
+rate_limit_stats = {"limited": 0, "shed": 0, "backend_errors": 0}
+
+
+class MemoryBuckets:
+    def __init__(self, maxsize: int = 100000):
+        # Entries expire after an hour idle; a full bucket needs no state
+        self._buckets = TTLCache(maxsize=maxsize, ttl=3600)
+
+    async def take(self, key: str, limit: Limit):
+        """Take one token. Returns 0 if allowed, else seconds until a token is available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key) or (limit.capacity, now)
+        tokens = min(limit.capacity, tokens + (now - updated) * limit.rate)
+        if tokens >= 1:
+            self._buckets.set(key, (tokens - 1, now))
+            return 0
+        self._buckets.set(key, (tokens, now))
+        return (1 - tokens) / limit.rate
+
+    def stats(self):
+        return self._buckets.stats()
+
+
+class PostgresBuckets:
+    """Same bucket arithmetic as MemoryBuckets, done in one UPSERT so workers share it."""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self):
+        self._calls = 0
+
+    async def take(self, key: str, limit: Limit):
+        async with get_async_db() as conn:
+            tokens = await conn.fetchval(
+                """
+                INSERT INTO rate_limits AS r (key, tokens, updated_at)
+                VALUES ($1, $2 - 1, now())
+                ON CONFLICT (key) DO UPDATE SET
+                    tokens = GREATEST(-1, LEAST($2, r.tokens + extract(epoch FROM now() - r.updated_at) * $3) - 1),
+                    updated_at = now()
+                RETURNING tokens
+                """,
+                key, float(limit.capacity), limit.rate,
+            )
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                await conn.execute("DELETE FROM rate_limits WHERE updated_at < now() - interval '1 day'")
+        if tokens >= 0:
+            return 0
+        # Denied requests leave the bucket at -1: two tokens' time until the next success
+        return 2 / limit.rate
+
+    def stats(self):
+        return {"calls": self._calls}
+
+
+def client_ip(scope) -> str:
+    """Client address, taken from X-Forwarded-For when FORWARDED_HOPS proxies append to it."""
+    if FORWARDED_HOPS > 0:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                hops = [h.strip() for h in value.decode("latin-1").split(",") if h.strip()]
+                if hops:
+                    return hops[-min(FORWARDED_HOPS, len(hops))]
+                break
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _bearer_user(scope):
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            value = value.decode("latin-1")
+            if value.startswith("Bearer "):
+                return user_id_from_token(value[7:])
+            return None
+    return None
+
+
+async def _reject(send, status: int, detail: str, retry_after: float):
+    body = orjson.dumps({"detail": detail})
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, int(retry_after + 0.999))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    def __init__(self, app, max_in_flight: int = MAX_IN_FLIGHT, enabled: bool = RATE_LIMIT_ENABLED):
+        self.app = app
+        self.enabled = enabled
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.local = MemoryBuckets()
+        self.shared = PostgresBuckets() if RATE_LIMIT_BACKEND == "postgres" else self.local
+        _middlewares.append(self)
+
+    async def _take(self, key: str, limit: Limit):
+        if self.shared is self.local:
+            return await self.local.take(key, limit)
+        try:
+            return await self.shared.take(key, limit)
+        except Exception as e:
+            rate_limit_stats["backend_errors"] += 1
+            print(f"Rate limit backend error, using local buckets: {e}")
+            return await self.local.take(key, limit)
+
+    async def _check(self, scope, route):
+        """Seconds to wait if any bucket for this request is empty, else 0."""
+        ip = client_ip(scope)
+        limits = ROUTE_LIMITS.get(route)
+        if limits is None:
+            return await self.local.take(f"{DEFAULT_LIMIT.name}:{ip}", DEFAULT_LIMIT)
+
+        user_id = None
+        if any(limit.by == "user" for limit in limits):
+            user_id = _bearer_user(scope)
+        wait = 0
+        for limit in limits:
+            key = f"{limit.name}:user:{user_id}" if limit.by == "user" and user_id else f"{limit.name}:ip:{ip}"
+            wait = max(wait, await self._take(key, limit))
+        return wait
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled or scope["method"] == "OPTIONS":
+            return await self.app(scope, receive, send)
+
+        route = (scope["method"], scope["path"])
+        counted = not scope["path"].endswith(UNCOUNTED_SUFFIXES)
+        if counted:
+            threshold = self.max_in_flight
+            if route in EXPENSIVE_ROUTES:
+                threshold = int(self.max_in_flight * SHED_EXPENSIVE_AT)
+            if self.in_flight >= threshold:
+                rate_limit_stats["shed"] += 1
+                return await _reject(send, 503, "Server busy, please retry.", 1)
+
+        wait = await self._check(scope, route)
+        if wait:
+            rate_limit_stats["limited"] += 1
+            return await _reject(send, 429, "Too many requests, please slow down.", wait)
+
+        if not counted:
+            return await self.app(scope, receive, send)
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+
+
+_middlewares = []
+
+
+def get_rate_limit_stats():
+    return {
+        **rate_limit_stats,
+        "enabled": RATE_LIMIT_ENABLED,
+        "backend": RATE_LIMIT_BACKEND,
+        "in_flight": sum(m.in_flight for m in _middlewares),
+        "max_in_flight": MAX_IN_FLIGHT,
+        "buckets": [m.local.stats() for m in _middlewares],
+    }
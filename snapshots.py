@@ -0,0 +1,157 @@
+import os
+import datetime
+import orjson
+from config import SNAPSHOT_DIR
+from db import get_db
+from get_youtube import youtube_cache
+from get_bluesky import bluesky_cache
+from get_pinecast import podcast_cache
+from feed import comments_cache
+
+# source name -> in-memory cache dict it is saved from / loaded into
+SOURCES = {
+    "youtube": youtube_cache,
+    "bluesky": bluesky_cache,
+    "comments": comments_cache,
+    "podcast": podcast_cache,
+}
+
+# Sources the ingest worker publishes to cache_snapshots. Comments are not
+# shared: every API process keeps its own copy current from NOTIFY.
+SHARED_SOURCES = ("youtube", "bluesky", "podcast")
+
+# source -> version currently loaded in this process
+_loaded_versions = {}
+
+
+def publish(source: str) -> int:
+    """Write the current contents of a cache to cache_snapshots. Returns the new version."""
+    payload = orjson.dumps(SOURCES[source]).decode("utf-8")
+    with get_db() as (conn, cur):
+        cur.execute(
+            """
+            INSERT INTO cache_snapshots (source, version, payload)
+            VALUES (%s, 1, %s::jsonb)
+            ON CONFLICT (source) DO UPDATE SET
+                version = cache_snapshots.version + 1,
+                payload = EXCLUDED.payload,
+                updated_at = now()
+            RETURNING version
+            """,
+            (source, payload),
+        )
+        version = cur.fetchone()[0]
+        conn.commit()
+    _loaded_versions[source] = version
+    return version
+
+
+def sync_snapshots() -> list:
+    """
+    Load any snapshot newer than the one this process holds and swap it into
+    the matching cache. Returns the sources that changed.
+    """
+    with get_db() as (conn, cur):
+        cur.execute("SELECT source, version FROM cache_snapshots")
+        stale = [
+            source for source, version in cur.fetchall()
+            if source in SHARED_SOURCES and version > _loaded_versions.get(source, 0)
+        ]
+        if not stale:
+            return []
+        cur.execute(
+            "SELECT source, version, payload FROM cache_snapshots WHERE source = ANY(%s)",
+            (stale,),
+        )
+        rows = cur.fetchall()
+
+    for source, version, payload in rows:
+        SOURCES[source].update(payload)
+        _loaded_versions[source] = version
+    return [row[0] for row in rows]
+
+
+def _newer(shared_updated, local_updated) -> bool:
+    if not shared_updated:
+        return False
+    if not local_updated:
+        return True
+    return datetime.datetime.fromisoformat(shared_updated) > datetime.datetime.fromisoformat(local_updated)
+
+
+def sync_newer_snapshots() -> list:
+    """
+    Ingest worker boot: load every shared snapshot that is newer than this
+    process's cache (or whose local file was missing), so a fresh dyno keeps
+    the YouTube index and Bluesky high_water instead of re-backfilling and
+    publishing a thinner copy. Returns the sources loaded.
+    """
+    with get_db() as (conn, cur):
+        cur.execute(
+            "SELECT source, version, payload->>'last_updated' FROM cache_snapshots WHERE source = ANY(%s)",
+            (list(SHARED_SOURCES),),
+        )
+        versions = {}
+        stale = []
+        for source, version, shared_updated in cur.fetchall():
+            versions[source] = version
+            if _newer(shared_updated, SOURCES[source].get("last_updated")):
+                stale.append(source)
+        if stale:
+            cur.execute("SELECT source, payload FROM cache_snapshots WHERE source = ANY(%s)", (stale,))
+            rows = cur.fetchall()
+        else:
+            rows = []
+
+    for source, payload in rows:
+        SOURCES[source].update(payload)
+    _loaded_versions.update(versions)
+    return [row[0] for row in rows]
+
+
+def snapshot_versions():
+    return dict(_loaded_versions)
+
+
+# ---------- LOCAL SNAPSHOT FILES (warm start) ----------
+
+def _local_path(source: str) -> str:
+    return os.path.join(SNAPSHOT_DIR, f"{source}.json")
+
+
+def save_local(source: str):
+    """Atomically write a cache to SNAPSHOT_DIR so the next boot can start from it."""
+    os.makedirs(SNAPSHOT_DIR, exist_ok=True)
+    path = _local_path(source)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(orjson.dumps(SOURCES[source]))
+    os.replace(tmp, path)
+
+
+def load_local() -> list:
+    """Load every local snapshot file into its cache. Returns the sources loaded."""
+    loaded = []
+    for source, cache in SOURCES.items():
+        try:
+            with open(_local_path(source), "rb") as f:
+                cache.update(orjson.loads(f.read()))
+            loaded.append(source)
+        except FileNotFoundError:
+            continue
+        except (OSError, orjson.JSONDecodeError) as e:
+            print(f"Error loading {source} snapshot: {e}")
+    return loaded
+
+
+def snapshot_ages(sources) -> dict:
+    """Seconds since each source was last refreshed (None if never)."""
+    now = datetime.datetime.now(datetime.timezone.utc)
+    ages = {}
+    for source in sources:
+        last_updated = SOURCES[source].get("last_updated")
+        if not last_updated:
+            ages[source] = None
+            continue
+        ages[source] = int((now - datetime.datetime.fromisoformat(last_updated)).total_seconds())
+    return ages
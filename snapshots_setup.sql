@@ -0,0 +1,9 @@
+-- Shared cache snapshots published by the ingestion worker (python -m ingest)
+-- Run this against your PostgreSQL database
+
+CREATE TABLE public.cache_snapshots (
+    source text NOT NULL PRIMARY KEY,
+    version bigint NOT NULL,
+    payload jsonb NOT NULL,
+    updated_at timestamptz DEFAULT now() NOT NULL
+);
@@ -0,0 +1,104 @@
+"""
+Pluggable image storage for profile pictures.
+
+Every stored image gets fixed square variants: VARIANTS["profile"] for the
+profile page and the smaller avatar sizes for comment lists. `avatar_url()`
+turns a stored profile picture URL into the matching avatar URL for either
+backend, so lists never load the full-size image.
+
+- CloudinaryStorage uploads the original and lets Cloudinary derive the sizes
+  on the fly (URL transformations).
+- LocalStorage resizes with Pillow at upload time and writes
+  MEDIA_DIR/<sha256>_<size>.jpg. Files are named by the hash of the uploaded
+  bytes, so re-uploading the same picture reuses the existing files, and
+  since a name never changes content they're served with immutable caching.
+"""
+import hashlib
+import io
+import os
+import re
+
+from config import STORAGE_BACKEND, MEDIA_DIR, MEDIA_BASE_URL
+
+VARIANTS = {"profile": 400, "avatar": 96, "avatar_small": 48}
+AVATAR_SIZE = VARIANTS["avatar"]
+
+MEDIA_NAME = re.compile(r"^[0-9a-f]{64}_\d+\.jpg$")
+_LOCAL_URL = re.compile(r"/media/([0-9a-f]{64})_\d+\.jpg$")
+_CLOUDINARY_URL = re.compile(r"^(https://res\.cloudinary\.com/[^/]+/image/upload/)(.*)$")
+
+
+class CloudinaryStorage:
+    name = "cloudinary"
+
+    def save(self, user_id: str, data: bytes) -> str:
+        import cloudinary.uploader
+
+        result = cloudinary.uploader.upload(
+            io.BytesIO(data),
+            public_id=str(user_id),
+            folder="profile_pics",
+            format="jpg",
+            overwrite=True,
+            transformation=[{"width": 400, "height": 400, "crop": "fill", "gravity": "face"}],
+        )
+        return result["secure_url"]
+
+
+class LocalStorage:
+    name = "local"
+
+    def __init__(self, root: str = MEDIA_DIR, base_url: str = MEDIA_BASE_URL):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def path(self, digest: str, size: int) -> str:
+        return os.path.join(self.root, f"{digest}_{size}.jpg")
+
+    def url(self, digest: str, size: int) -> str:
+        return f"{self.base_url}/media/{digest}_{size}.jpg"
+
+    def save(self, user_id: str, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        sizes = sorted(VARIANTS.values(), reverse=True)
+        if not all(os.path.exists(self.path(digest, size)) for size in sizes):
+            self._write_variants(digest, data, sizes)
+        return self.url(digest, VARIANTS["profile"])
+
+    def _write_variants(self, digest: str, data: bytes, sizes):
+        from PIL import Image, ImageOps
+
+        os.makedirs(self.root, exist_ok=True)
+        with Image.open(io.BytesIO(data)) as img:
+            img = ImageOps.exif_transpose(img).convert("RGB")
+            # No face detection here: bias the crop towards the top, where faces usually are
+            square = ImageOps.fit(img, (sizes[0], sizes[0]), Image.LANCZOS, centering=(0.5, 0.35))
+        for size in sizes:
+            variant = square if size == sizes[0] else square.resize((size, size), Image.LANCZOS)
+            path = self.path(digest, size)
+            tmp = f"{path}.{os.getpid()}.tmp"
+            variant.save(tmp, "JPEG", quality=85, optimize=True, progressive=True)
+            os.replace(tmp, path)
+
+
+def avatar_url(url, size: int = AVATAR_SIZE):
+    """The `size` px square version of a stored profile picture URL (unchanged if not ours)."""
+    if not url:
+        return url
+    local = _LOCAL_URL.search(url)
+    if local:
+        return url[:local.start()] + f"/media/{local.group(1)}_{size}.jpg"
+    remote = _CLOUDINARY_URL.match(url)
+    if remote:
+        return f"{remote.group(1)}w_{size},h_{size},c_fill,g_face/{remote.group(2)}"
+    return url
+
+
+_storage = None
+
+
+def get_storage():
+    global _storage
+    if _storage is None:
+        _storage = LocalStorage() if STORAGE_BACKEND == "local" else CloudinaryStorage()
+    return _storage
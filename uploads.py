@@ -0,0 +1,183 @@
+"""
+Profile picture upload pipeline.
+
+The request handler reads the multipart body through `read_upload()`, which
+stops with a 413 as soon as UPLOAD_MAX_BYTES is exceeded (the body is never
+buffered past the cap), checks the image type from its magic bytes, and hands
+the bytes to `submit_upload()`. Storing the image (storage.get_storage()) and
+the profile update then run on a small thread pool; clients poll the returned
+job id.
+"""
+import time
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi import HTTPException, Request
+
+from cache import TTLCache
+from config import UPLOAD_MAX_BYTES, UPLOAD_WORKERS, UPLOAD_MAX_PENDING
+from db import get_db
+from storage import get_storage
+from util import invalidate_user, publish_user_change
+
+# Multipart framing around the file part; anything past this is rejected unread
+FORM_OVERHEAD_BYTES = 16 * 1024
+
+MAGIC_BYTES = {
+    b"\xff\xd8\xff": "jpeg",
+    b"\x89PNG\r\n\x1a\n": "png",
+}
+
+# job_id -> {"id", "user_id", "status", "url", "error", "queued_at", "upload_seconds", "total_seconds"}
+upload_jobs = TTLCache(maxsize=10000, ttl=3600)
+
+upload_stats = {
+    "submitted": 0, "succeeded": 0, "failed": 0, "rejected": 0,
+    "too_large": 0, "bad_type": 0, "upload_seconds_total": 0.0, "upload_seconds_max": 0.0,
+}
+
+_executor = None
+_pending = 0
+_pending_lock = threading.Lock()
+
+
+def image_type(head: bytes):
+    """'jpeg' or 'png' from the first bytes of the file, else None."""
+    for magic, kind in MAGIC_BYTES.items():
+        if head.startswith(magic):
+            return kind
+    return None
+
+
+def _too_large():
+    upload_stats["too_large"] += 1
+    return HTTPException(status_code=413, detail=f"File too large (max {UPLOAD_MAX_BYTES // (1024 * 1024)} MB).")
+
+
+async def read_upload(request: Request, field: str = "file") -> bytes:
+    """Parse the multipart body with a hard byte cap and return the validated image bytes."""
+    limit = UPLOAD_MAX_BYTES + FORM_OVERHEAD_BYTES
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > limit:
+        raise _too_large()
+
+    received = 0
+    receive = request.receive
+
+    async def limited_receive():
+        nonlocal received
+        message = await receive()
+        if message["type"] == "http.request":
+            received += len(message.get("body", b""))
+            if received > limit:
+                raise _too_large()
+        return message
+
+    limited = Request(request.scope, limited_receive)
+    form = await limited.form(max_files=1, max_fields=10)
+    try:
+        upload = form.get(field)
+        if upload is None or isinstance(upload, str):
+            raise HTTPException(status_code=400, detail="No file uploaded.")
+        data = await upload.read(UPLOAD_MAX_BYTES + 1)
+    finally:
+        await form.close()
+
+    if len(data) > UPLOAD_MAX_BYTES:
+        raise _too_large()
+    if image_type(data[:8]) is None:
+        upload_stats["bad_type"] += 1
+        raise HTTPException(status_code=400, detail="Only JPEG and PNG images allowed.")
+    return data
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix="upload")
+    return _executor
+
+
+def _run_upload(job, data: bytes):
+    global _pending
+    job["status"] = "running"
+    try:
+        started = time.monotonic()
+        url = get_storage().save(job["user_id"], data)
+        upload_seconds = time.monotonic() - started
+
+        with get_db() as (conn, cur):
+            cur.execute(
+                "UPDATE user_profiles SET profile_picture = %s WHERE user_id = %s",
+                (url, job["user_id"]),
+            )
+            publish_user_change(cur, job["user_id"])
+            conn.commit()
+        invalidate_user(job["user_id"])
+
+        job.update(status="done", url=url, upload_seconds=round(upload_seconds, 3))
+        upload_stats["succeeded"] += 1
+        upload_stats["upload_seconds_total"] += upload_seconds
+        upload_stats["upload_seconds_max"] = max(upload_stats["upload_seconds_max"], upload_seconds)
+    except Exception as e:
+        job.update(status="failed", error="Image upload failed.")
+        upload_stats["failed"] += 1
+        print(f"Error uploading profile picture for {job['user_id']}: {e}")
+    finally:
+        job["total_seconds"] = round(time.monotonic() - job["queued_at"], 3)
+        with _pending_lock:
+            _pending -= 1
+
+
+def submit_upload(user_id, data: bytes):
+    """Queue the upload and profile update; returns the job dict. 503 when the queue is full."""
+    global _pending
+    with _pending_lock:
+        if _pending >= UPLOAD_MAX_PENDING:
+            upload_stats["rejected"] += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Too many uploads in progress, please retry.",
+                headers={"Retry-After": "5"},
+            )
+        _pending += 1
+
+    job = {
+        "id": uuid.uuid4().hex,
+        "user_id": str(user_id),
+        "status": "queued",
+        "url": None,
+        "error": None,
+        "queued_at": time.monotonic(),
+        "upload_seconds": None,
+        "total_seconds": None,
+    }
+    upload_jobs.set(job["id"], job)
+    upload_stats["submitted"] += 1
+    _get_executor().submit(_run_upload, job, data)
+    return job
+
+
+def job_status(job):
+    return {key: job[key] for key in ("id", "status", "url", "error", "upload_seconds", "total_seconds")}
+
+
+def shutdown_uploads():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)  # let in-flight uploads land their profile update
+        _executor = None
+
+
+def get_upload_stats():
+    done = upload_stats["succeeded"]
+    return {
+        **upload_stats,
+        "pending": _pending,
+        "max_pending": UPLOAD_MAX_PENDING,
+        "workers": UPLOAD_WORKERS,
+        "backend": get_storage().name,
+        "upload_seconds_avg": round(upload_stats["upload_seconds_total"] / done, 3) if done else None,
+        "jobs": upload_jobs.stats(),
+    }
@@ -1,37 +1,115 @@
 import os
+import time
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import jwt
+from cache import TTLCache
+from config import USER_CACHE_SIZE, USER_CACHE_TTL, TOKEN_CACHE_SIZE
 from db import SECRET_KEY, get_db
+from profiling import profiled_worker
+import notify
 
 auth_scheme = HTTPBearer()
 
 SUPERUSER_ID = os.getenv("SUPERUSER_ID")
 
+# user_id -> {"id", "email", "is_superuser"}
+user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+# raw JWT -> user_id, for tokens that already passed signature/expiry checks
+token_cache = TTLCache(maxsize=TOKEN_CACHE_SIZE, ttl=USER_CACHE_TTL)
 
+
+def invalidate_user(user_id):
+    """
+    Drop a user's cached principal and verified tokens in this process.
+    Call after changing the user; pair it with publish_user_change so the
+    other workers drop theirs too. user_id=None drops every user.
+    """
+    if user_id is None:
+        user_cache.clear()
+        token_cache.clear()
+        return
+    user_id = str(user_id)
+    user_cache.pop(user_id)
+    token_cache.discard_where(lambda cached_id: cached_id == user_id)
+
+
+def publish_user_change(cur, user_id):
+    """
+    Call inside the transaction that changes a user. Every process drops its
+    cached copy of the user when it commits.
+    """
+    notify.notify(cur, notify.USERS_CHANNEL, str(user_id))
+
+
+notify.on(notify.USERS_CHANNEL, invalidate_user)
+
+
+def auth_cache_stats():
+    return {"users": user_cache.stats(), "tokens": token_cache.stats()}
+
+
+def _verify_token(token: str) -> str:
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
+    user_id = payload.get("sub")
+    if not user_id:
+        raise HTTPException(status_code=401, detail="Invalid token.")
+
+    # Never cache a token beyond its own expiry
+    ttl = USER_CACHE_TTL
+    if "exp" in payload:
+        ttl = min(ttl, payload["exp"] - time.time())
+    if ttl > 0:
+        token_cache.set(token, user_id, ttl=ttl)
+    return user_id
+
+
+def user_id_from_token(token: str):
+    """User id from a token, or None if it's missing, expired or invalid. No DB lookup."""
+    try:
+        return _verify_token(token)
+    except (jwt.InvalidTokenError, HTTPException):
+        return None
+
+
+def is_superuser_token(token: str) -> bool:
+    """True for a valid, unexpired token belonging to SUPERUSER_ID. No DB lookup."""
+    return bool(SUPERUSER_ID) and user_id_from_token(token) == SUPERUSER_ID
+
+
+@profiled_worker
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(auth_scheme)):
     token = credentials.credentials
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token.")
-        with get_db() as (conn, cur):
-            cur.execute("SELECT id, email FROM users WHERE id = %s", (user_id,))
-            user = cur.fetchone()
-        if not user:
-            raise HTTPException(status_code=401, detail="User not found.")
-        return {
-            "id": user[0],
-            "email": user[1],
-            "is_superuser": str(user[0]) == SUPERUSER_ID,
-        }
+        user_id = _verify_token(token)
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired.")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token.")
 
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    with get_db() as (conn, cur):
+        cur.execute("SELECT id, email FROM users WHERE id = %s", (user_id,))
+        row = cur.fetchone()
+    if not row:
+        raise HTTPException(status_code=401, detail="User not found.")
+    user = {
+        "id": row[0],
+        "email": row[1],
+        "is_superuser": str(row[0]) == SUPERUSER_ID,
+    }
+    user_cache.set(user_id, user)
+    return user
+
 
+@profiled_worker
 def require_superuser(current_user: dict = Depends(get_current_user)):
     if not current_user["is_superuser"]:
         raise HTTPException(status_code=403, detail="Superuser access required.")